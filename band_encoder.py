@@ -0,0 +1,166 @@
+"""
+Multi-process diff + encode for big frames.
+
+The frame's character rows get split into horizontal bands, and a pool of worker processes diffs and encodes every
+band at the same time. The pixels are never pickled: both frames get copied into `multiprocessing.shared_memory`
+blocks, which the workers map once and read straight from. Only the encoded bytes of each band come back.
+"""
+
+import os
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Tuple
+import numpy as np
+from utils import get_cell_diffs, get_diff_bounds
+from encoder import encode_spans, count_sgr
+from term_state import TermState
+from palette import ColorMode
+
+BandResult = Tuple[
+    bytes, Tuple[int, int] | None, Tuple[int, int, int] | None, Tuple[int, int, int] | None, Tuple[int, int, int, int],
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+]
+""" (encoded bytes, cursor, fg, bg, stats, spans) a worker returns for a band. cursor/fg/bg are what the band left the terminal
+with (None if unknown). stats are (dirty rows, dirty cells, color sequences, cursor moves), for `RenderMetrics`.
+spans are the (rows, starts, ends) that got printed (ends inclusive), for the screen memory. """
+
+# worker process side
+
+_attached: Dict[str, Tuple[SharedMemory, np.ndarray]] = {}
+""" Shared memory blocks this worker has already mapped, by name. """
+
+_worker_state: TermState | None = None
+""" Terminal model every band gets encoded with (reset before every band). Kept so its buffer gets reused. """
+
+def _attach(name: str, shape: Tuple[int, int, int]) -> np.ndarray:
+    """ Maps the shared memory block `name` as a (h, w, 3) pixel array, once per worker. """
+    if name not in _attached:
+        shm = SharedMemory(name=name)
+        # the main process owns (and unlinks) the block. without this, the worker's resource tracker would
+        # also try to clean it up when the worker exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        _attached[name] = (shm, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    return _attached[name][1]
+
+def _encode_band(args) -> BandResult:
+    """ Diffs + encodes character rows `row1` -> `row2` (exclusive) of the frame in shared memory. Runs in a worker.
+    The band starts with an absolute cursor move and full color codes, since a worker can't know what the bands
+    before it leave behind. """
+    global _worker_state
+    cur_name, prev_name, shape, row1, row2, pos, term_width, color_mode, rep_threshold, pick_glyphs, tolerance = args
+    cur = _attach(cur_name, shape)
+    prev = _attach(prev_name, shape)
+
+    if _worker_state is None:
+        _worker_state = TermState()
+    state = _worker_state
+    state.invalidate()
+    state.width = term_width
+
+    cell_diffs = get_cell_diffs(cur[row1*2:row2*2], prev[row1*2:row2*2], tolerance)
+    starts, ends = get_diff_bounds(cell_diffs)
+    changed = np.flatnonzero(starts != -1)
+    if len(changed) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return b'', None, None, None, (0, 0, 0, 0), (empty, empty, empty)
+
+    rows, starts, ends = changed + row1, starts[changed], ends[changed]
+    data, span_offsets, (fg, bg) = encode_spans(
+        cur, rows, starts, ends, color_mode=color_mode, rep_threshold=rep_threshold, pick_glyphs=pick_glyphs
+    )
+    span_offsets = span_offsets.tolist()
+
+    buffer = state.buffer
+    buffer.clear()
+    moves = 0
+    for k, (i, start, end) in enumerate(zip(rows.tolist(), starts.tolist(), ends.tolist())):
+        move = state.move_to(start+pos[0], i+pos[1]//2)
+        moves += len(move) > 0
+        buffer.write(move)
+        buffer.write(data[span_offsets[k]:span_offsets[k+1]])
+        state.advance(end-start+1)
+
+    stats = (len(rows), int((ends-starts+1).sum()), count_sgr(data), moves)
+    return bytes(buffer.getvalue()), state.cursor, fg, bg, stats, (rows, starts, ends)
+
+# main process side
+
+class BandEncoder:
+    """
+    Process pool + shared memory for `CameraFrame.render_parallel`.
+
+    Create it once, before starting any other threads (e.g. a `FrameWriter`), since the workers get forked.
+    It holds on to processes and shared memory, so `close()` it when done.
+
+    Only worth it for big frames with a lot of motion - for small or mostly static frames the overhead
+    of handing work to other processes is more than what the diff + encode costs in the first place.
+    """
+
+    def __init__(self, workers: int | None = None, bands_per_worker: int = 2) -> None:
+        """
+        - `workers`: number of worker processes. Defaults to the number of cores.
+        - `bands_per_worker`: how many bands every worker gets per frame. A bit more than 1 evens out
+        bands that happen to have more changes than others.
+        """
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.bands_per_worker = bands_per_worker
+        self.pool = Pool(self.workers)
+
+        self.shape: Tuple[int, int, int] | None = None
+        """ Shape of the frames the shared memory blocks were made for. """
+        self.shm_cur: SharedMemory | None = None
+        self.shm_prev: SharedMemory | None = None
+        self.cur: np.ndarray | None = None
+        """ Frame being rendered, in shared memory. """
+        self.prev: np.ndarray | None = None
+        """ Frame it gets diffed against, in shared memory. """
+
+    def _ensure_shape(self, shape: Tuple[int, int, int]) -> None:
+        """ (Re)allocates the shared memory blocks if the frame size changed. """
+        if self.shape == shape:
+            return
+        self._free_shm()
+        size = int(np.prod(shape))
+        self.shm_cur = SharedMemory(create=True, size=size)
+        self.shm_prev = SharedMemory(create=True, size=size)
+        self.cur = np.ndarray(shape, dtype=np.uint8, buffer=self.shm_cur.buf)
+        self.prev = np.ndarray(shape, dtype=np.uint8, buffer=self.shm_prev.buf)
+        self.shape = shape
+
+    def _free_shm(self) -> None:
+        self.cur = self.prev = None
+        for shm in (self.shm_cur, self.shm_prev):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self.shm_cur = self.shm_prev = None
+        self.shape = None
+
+    def encode(
+        self, pixels: np.ndarray, prev_pixels: np.ndarray, pos: Tuple[int, int], term_width: int | None,
+        color_mode: ColorMode = "truecolor", rep_threshold: int | None = None, pick_glyphs: bool = True, tolerance: int = 0
+        ) -> List[BandResult]:
+        """ Diffs + encodes `pixels` against `prev_pixels` (both (h, w, 3)) in parallel, with a diff `tolerance`
+        (see `get_cell_diffs`). Returns one result per band, top to bottom. """
+        self._ensure_shape(pixels.shape)
+        np.copyto(self.cur, pixels)
+        np.copyto(self.prev, prev_pixels)
+
+        char_rows = pixels.shape[0] // 2
+        n_bands = max(1, min(char_rows, self.workers * self.bands_per_worker))
+        edges = np.linspace(0, char_rows, n_bands+1).astype(int).tolist()
+
+        jobs = [
+            (
+                self.shm_cur.name, self.shm_prev.name, self.shape, edges[k], edges[k+1], pos, term_width,
+                color_mode, rep_threshold, pick_glyphs, tolerance
+            )
+            for k in range(n_bands) if edges[k] < edges[k+1]
+        ]
+        return self.pool.map(_encode_band, jobs, chunksize=1)
+
+    def close(self) -> None:
+        """ Stops the workers and frees the shared memory. """
+        self.pool.close()
+        self.pool.join()
+        self._free_shm()
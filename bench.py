@@ -0,0 +1,231 @@
+"""
+Benchmarks every CameraFrame renderer on the same reproducible frame sequences, and reports ms/frame and bytes/frame.
+
+    python bench.py                       # all scenarios, all renderers
+    python bench.py -s sprites -r render render_intervaled -n 200
+    python bench.py --video badapple72p.mp4 --json bench.json
+    python bench.py --verify              # also check every frame's output in a VirtualTerminal
+
+Output goes to a temp file instead of the terminal (stdout, fd 1, is pointed at it while a renderer runs),
+so terminal speed doesn't count, and the file's size after every frame gives the exact bytes per frame.
+`curses_render` isn't included, since it needs a curses screen.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List
+import numpy as np
+
+from gd_constants import stuff
+from camera_frame import CameraFrame
+from virtual_terminal import VirtualTerminal
+
+RENDERERS = [
+    "render", "render_intervaled", "render_bufferlist", "render_usingwhile", "render2_usingdists", "render3_iterpixelidxs",
+]
+""" Renderers that get benchmarked by default. `render_parallel` can be added with `--parallel`. """
+
+# scenarios: every one yields `n` (h, w, 3) uint8 frames, always the same ones for the same seed
+
+def noise(w: int, h: int, n: int, seed: int) -> Iterator[np.ndarray]:
+    """ Every pixel changes every frame. Worst case for diffing, lots of color codes. """
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        yield rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+def scrolling(w: int, h: int, n: int, seed: int) -> Iterator[np.ndarray]:
+    """ A wide image scrolling left by 1px per frame. Most cells change, but runs of the same color are common. """
+    rng = np.random.default_rng(seed)
+    # big flat blocks of color + a gradient, so there's something to scroll
+    blocks = rng.integers(0, 256, (h//8+1, (w+n)//8+1, 3), dtype=np.uint8)
+    image = np.repeat(np.repeat(blocks, 8, axis=0), 8, axis=1)[:h, :w+n]
+    image[:, :, 2] = np.linspace(0, 255, w+n).astype(np.uint8)
+    for k in range(n):
+        yield image[:, k:k+w]
+
+def sprites(w: int, h: int, n: int, seed: int, count: int = 6, size: int = 8) -> Iterator[np.ndarray]:
+    """ A few small sprites moving around on a static background. Sparse changes, like a game. """
+    rng = np.random.default_rng(seed)
+    background = np.zeros((h, w, 3), dtype=np.uint8)
+    background[:, :] = (20, 30, 60)
+    background[h//2:] = (40, 110, 40)
+    sprite_pixels = rng.integers(0, 256, (count, size, size, 3), dtype=np.uint8)
+    pos = rng.uniform(0, (w-size, h-size), (count, 2))
+    vel = rng.uniform(-2, 2, (count, 2))
+    for _ in range(n):
+        frame = background.copy()
+        for s in range(count):
+            x, y = pos[s].astype(int)
+            frame[y:y+size, x:x+size] = sprite_pixels[s]
+        pos += vel
+        bounce = (pos < 0) | (pos > (w-size, h-size))
+        vel[bounce] *= -1
+        pos = np.clip(pos, 0, (w-size, h-size))
+        yield frame
+
+def video(path: str) -> Callable[[int, int, int, int], Iterator[np.ndarray]]:
+    """ Frames of a video file, scaled to fit in the frame size. """
+    def frames(w: int, h: int, n: int, seed: int) -> Iterator[np.ndarray]:
+        from vid_to_np import iter_frames
+        canvas = np.zeros((h, w, 3), dtype=np.uint8)
+        for _, frame in zip(range(n), iter_frames(path, width=w, height=h)):
+            canvas[:frame.shape[0], :frame.shape[1]] = frame
+            yield canvas
+    return frames
+
+SCENARIOS: Dict[str, Callable[[int, int, int, int], Iterator[np.ndarray]]] = {
+    "noise": noise,
+    "scrolling": scrolling,
+    "sprites": sprites,
+}
+
+class Sink:
+    """ Points stdout (fd 1) at a temp file while active. `size()` is how many bytes were written so far. """
+
+    def __enter__(self) -> "Sink":
+        sys.stdout.flush()
+        self.saved = os.dup(1)
+        self.file = tempfile.TemporaryFile()
+        os.dup2(self.file.fileno(), 1)
+        return self
+
+    def size(self) -> int:
+        sys.stdout.flush() # print3 goes through sys.stdout's buffer
+        return os.fstat(1).st_size
+
+    def read(self) -> bytes:
+        """ Everything written since the last `reset`. """
+        sys.stdout.flush()
+        return os.pread(1, os.fstat(1).st_size, 0)
+
+    def reset(self) -> None:
+        sys.stdout.flush()
+        os.ftruncate(1, 0)
+        os.lseek(1, 0, os.SEEK_SET)
+
+    def __exit__(self, *exc) -> None:
+        sys.stdout.flush()
+        os.dup2(self.saved, 1)
+        os.close(self.saved)
+        self.file.close()
+
+def bench(renderer: str, frames: List[np.ndarray], sink: Sink, band_encoder=None, verify: bool = False) -> Dict[str, float]:
+    """ Renders every frame (each one diffed against the one before it) with `renderer`. The first frame gets
+    printed with `render_raw` and isn't counted.
+    
+    With `verify`, the output also goes through a `VirtualTerminal` (outside of the timed part), and a frame
+    that doesn't end up on its screen exactly raises an AssertionError. """
+    h, w = frames[0].shape[:2]
+    front, back = CameraFrame((w, h)), CameraFrame((w, h))
+    stuff.term_state.invalidate()
+    vt = VirtualTerminal(w, h//2) if verify else None
+
+    front.add_pixels_topleft(0, 0, frames[0])
+    front.render_raw()
+    if vt is not None:
+        vt.write(sink.read())
+        vt.stats.clear()
+    sink.reset()
+
+    times = np.zeros(len(frames)-1)
+    sizes = np.zeros(len(frames)-1, dtype=np.int64)
+    for k, frame in enumerate(frames[1:]):
+        back.clear()
+        back.add_pixels_topleft(0, 0, frame)
+
+        time_start = perf_counter()
+        if band_encoder is not None:
+            back.render_parallel(front, band_encoder)
+        else:
+            getattr(back, renderer)(front)
+        times[k] = perf_counter() - time_start
+
+        sizes[k] = sink.size()
+        if vt is not None:
+            vt.write(sink.read())
+            assert (vt.pixels() == back.pixels).all(), f"{renderer}: frame {k+1} doesn't match what's on the screen"
+        sink.reset()
+        front, back = back, front
+
+    result = {
+        "ms_per_frame": float(times.mean()*1000),
+        "p95_ms": float(np.percentile(times, 95)*1000),
+        "bytes_per_frame": float(sizes.mean()),
+    }
+    if vt is not None:
+        # how long the emulator took to parse it, a rough measure of how hard the output is on a terminal
+        result["parse_ms_per_frame"] = sum(entry[2] for entry in vt.stats.values()) * 1000 / len(times)
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenarios", nargs="+", default=None, help="scenarios to run (default: all)")
+    parser.add_argument("-r", "--renderers", nargs="+", default=RENDERERS, help="renderers to benchmark")
+    parser.add_argument("-n", "--frames", type=int, default=60, help="frames per scenario")
+    parser.add_argument("--size", type=int, nargs=2, default=(120, 60), metavar=("W", "H"), help="frame size in pixels (H even)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--video", default="badapple72p.mp4", help="video for the video scenario (skipped if missing)")
+    parser.add_argument("--parallel", type=int, default=0, metavar="WORKERS", help="also benchmark render_parallel")
+    parser.add_argument("--color-mode", default="truecolor", choices=["truecolor", "256", "16"])
+    parser.add_argument("--rep", action="store_true", help="turn on REP encoding")
+    parser.add_argument("--verify", action="store_true", help="check every frame's output in a VirtualTerminal")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    scenarios = dict(SCENARIOS)
+    if os.path.exists(args.video):
+        scenarios["video"] = video(args.video)
+    names = args.scenarios if args.scenarios is not None else list(scenarios)
+
+    band_encoder = None
+    renderers = list(args.renderers)
+    if args.parallel > 0:
+        from band_encoder import BandEncoder
+        band_encoder = BandEncoder(args.parallel) # before anything else starts threads
+        renderers.append("render_parallel")
+
+    if not stuff.term.does_styling:
+        # stdout isn't a terminal, but the renderers should still output what they would on one
+        from blessed import Terminal
+        stuff.term = Terminal(force_styling=True)
+    state = stuff.term_state
+    state.term = stuff.term
+    state.color_mode = args.color_mode
+    state.rep_threshold = 2 if args.rep else None
+
+    w, h = args.size
+    results = []
+    try:
+        for name in names:
+            frames = [f.copy() for f in scenarios[name](w, h, args.frames, args.seed)]
+            for renderer in renderers:
+                try:
+                    with Sink() as sink:
+                        result = bench(
+                            renderer, frames, sink, band_encoder if renderer == "render_parallel" else None, args.verify
+                        )
+                except Exception as e:
+                    # some of the old renderers don't handle every kind of frame. report it and keep going
+                    results.append({"scenario": name, "renderer": renderer, "error": repr(e)})
+                    print(f"{name:<10} {renderer:<22} failed: {e!r}")
+                    continue
+                results.append({"scenario": name, "renderer": renderer, **result})
+                print(
+                    f"{name:<10} {renderer:<22} {result['ms_per_frame']:9.2f} ms/frame (p95 {result['p95_ms']:8.2f})"
+                    f" {result['bytes_per_frame']:12.0f} bytes/frame"
+                    + (f" (parse {result['parse_ms_per_frame']:.2f} ms/frame)" if args.verify else "")
+                )
+    finally:
+        if band_encoder is not None:
+            band_encoder.close()
+
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"size": [w, h], "frames": args.frames, "seed": args.seed, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,19 @@
 import curses
 from typing import TYPE_CHECKING, Literal, Tuple, List
 from utils import (
-    fcode_opt as fco, blend_rgba_img_onto_rgb_img_inplace, 
-    first_diff_color, last_diff_color, lesser, greater, draw_line, print3,
-    get_diff_intervals, combine_intervals, distances_to_false, get_false_chunk_sizes
+    fcode_opt as fco, blend_rgba_img_onto_rgb_img_inplace, draw_line, print3,
+    get_cell_diffs, get_diff_bounds, get_frame_diff_bounds, get_frame_diff_intervals, distances_to_false, get_false_chunk_sizes
 )
+from encoder import encode_spans, bridge_gaps, count_sgr
+from palette import snap_to_palette, ColorMode
+if TYPE_CHECKING:
+    from band_encoder import BandEncoder
 from time import perf_counter
-from threading import Thread
 from logger import Logger
 import numpy as np
 from gd_constants import stuff
+from output_buffer import OutputBuffer
+from term_state import UNKNOWN_ERROR
 
 RGBTuple = Tuple[int, int, int]
 RGBATuple = Tuple[int, int, int, int]
@@ -44,12 +48,28 @@ class CameraFrame:
         """ Set of color pairs that have been initialized. """
         
         self.pixels: np.ndarray = np.zeros((self.height, self.width, 3), dtype=np.uint8)
-        """ 2d array of pixels. Each pixel is an rgb tuple. (0, 0) is the top left of the frame, not the top left of the screen. """
+        """ 2d array of pixels. Each pixel is an rgb tuple. (0, 0) is the top left of the frame, not the top left of the screen.
+        If you write to this directly (instead of using the drawing methods), call `mark_dirty` on the area you changed. """
+        
+        self.dirty_x0: np.ndarray = np.full(self.height, self.width, dtype=np.int32)
+        """ For every row of pixels, the first column drawn on since the last `clear`/`fill` (`width` if none). """
+        self.dirty_x1: np.ndarray = np.zeros(self.height, dtype=np.int32)
+        """ For every row of pixels, the last column (exclusive) drawn on since the last `clear`/`fill` (0 if none). """
+        self.base_color: RGBTuple | None = (0, 0, 0)
+        """ Color of every pixel outside of the dirty region. None if unknown, which makes the whole frame count as dirty. """
+        self.snapped_to: ColorMode | None = None
+        """ Color mode the pixels got snapped to by the last render (see `_apply_color_mode`), until they get drawn on again. """
 
     def render_raw(self) -> None:
         """ Simply prints the frame to the screen, without the need for a previous frame. 
         Keep in mind, this is quite slow and should only be used for rendering the first frame. """
         
+        if stuff.term_state.color_mode != "truecolor" and self.pos[1] % 2 == 0:
+            # fcode_opt only does truecolor, so go through the encoder instead
+            self.render_full()
+            return
+        
+        time_start = perf_counter()
         # handle odd starting y. NOTE - this wont happen for now, since we are requiring even starting y and height.
         if self.pos[1] % 2 == 1:
             # first line prints bottom half char (top half will be terminal default bg)
@@ -87,6 +107,29 @@ class CameraFrame:
                 #compiled_str += string + "\n"
                 print3(stuff.term.move_xy(self.pos[0], (i+self.pos[1])//2) + string)
             #print3(stuff.term.move_xy(self.pos[0], self.pos[1]//2) + compiled_str)
+        
+        if stuff.term_state.metrics is not None:
+            # built + printed row by row through print3, so it's all one number, and the output isn't counted
+            rows = self.height // 2
+            stuff.term_state.metrics.record("render_raw", 0, perf_counter()-time_start, 0, rows, rows*self.width, -1, -1, -1)
+        if stuff.term_state.tiles is not None:
+            stuff.term_state.tiles.forget(self.pos, self.width, self.height) # printed without updating the digests
+        self._sync_screen()
+
+    def render_full(self) -> None:
+        """ Prints every cell of the frame through the encoder (same output path as `render`, unlike `render_raw`).
+        Starts with an absolute cursor move and full color codes, so the output doesn't depend on what the terminal
+        was left with - it can be played back on its own, e.g. as a keyframe (see `delta_stream`). """
+        
+        self._apply_color_mode()
+        rows = np.arange(self.height//2)
+        state = stuff.term_state
+        # not `invalidate()`: that would also forget the screen memory of every other frame's area
+        state.cursor = state.fg = state.bg = None
+        self._print_spans(rows, np.zeros_like(rows), np.full_like(rows, self.width-1), "render_raw")
+        if state.tiles is not None:
+            state.tiles.forget(self.pos, self.width, self.height) # printed without updating the digests
+        self._sync_screen()
 
     def curses_render_raw(self) -> None:
         for top_row_index in range(0, self.height, 2):       
@@ -116,7 +159,7 @@ class CameraFrame:
                     #Logger.log(f"scaled fg: {scaled_fg}, scaled bg: {scaled_bg}, fg_1000_based: {fg_1000_based}, bg_1000_based: {bg_1000_based}")
                     curses.init_color(scaled_fg << 4, fg_1000_based, fg_1000_based, fg_1000_based)
                     curses.init_color(scaled_bg, bg_1000_based, bg_1000_based, bg_1000_based)
-                    Logger.log(f"rend raw: color key: {color_key}, fg: {scaled_fg << 4}, bg: {scaled_bg}")
+                    Logger.debug("rend raw: color key: %s, fg: %s, bg: %s", color_key, scaled_fg << 4, scaled_bg)
                     curses.init_pair(color_key, scaled_fg << 4, scaled_bg)
                     self.initialized_colors.add(color_key)                        
                 
@@ -129,154 +172,341 @@ class CameraFrame:
         #Logger.log(f"(raw) refreshing curses screen")
         stuff.screen.refresh()
 
-    # XXX - main render func, This can still be improved by adding a huge chunk of pixels at once
-    # if there is a lot of pixels with the same color, then skipping to the next different color
-    def render(self, prev_frame: "CameraFrame") -> None:
-        """ Prints the frame to the screen.
-        Optimized by only printing the changes from the previous frame. """
+    def mark_dirty(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """ Marks the rectangle x1 -> x2, y1 -> y2 (exclusive, in pixels, gets clipped to the frame) as drawn on,
+        so `render` knows it might be different from the previous frame. The drawing methods do this on their own. """
+        x1, x2 = max(0, int(x1)), min(self.width, int(x2))
+        y1, y2 = max(0, int(y1)), min(self.height, int(y2))
+        if x1 >= x2 or y1 >= y2:
+            return
         
-        final_string = ""
-
-        i = 0
-        for top_row_index in range(0, self.height, 2):       
-            first_diff_row1 = first_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            first_diff_row2 = first_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            last_diff_row1 = last_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            last_diff_row2 = last_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            print_start = lesser(first_diff_row1, first_diff_row2)
-            print_end = greater(last_diff_row1, last_diff_row2)
-            
-            start, end = print_start, print_end
-            
-            # if both are None, that means the rows were the exact same, so we don't need to print anything
-            if start is None and end is None:
-                #Logger.log(f"Skipping row {i} since it's the same as the previous row!")
-                i += 1
-                continue
-
-            final_string += stuff.term.move_xy(int(start)+self.pos[0], i+self.pos[1]//2)
-            string = ""
-            # get a numpy array of which indices are repeat colors (so we can skip fcode)
-            color_strip = self.pixels[i*2:i*2+2, start:end+1]
-            colors_diffs = np.any(color_strip[:, 1:] != color_strip[:, :-1], axis=(0, 2))
-            """ [diff(1, 0), diff(2, 1), ...]. True if different, False if same. """
-            #Logger.log(f"color strip 1 first 5: {color_strip[0, :5]}")
-            #Logger.log(f"color strip 2 first 5: {color_strip[1, :5]}")
-            #
-            #Logger.log(f"colors_diffs: {colors_diffs[:5]}")
-            
-            # add the first pixel
-            string += fco(self.pixels[i*2,start], self.pixels[i*2+1,start]) + '▀'
-
-            for j in range(start+1, end+1):
-                # if colors_diffs is True for the current pixel, that means the colors are different from the previous pixel
-                # in that case we have to re-fcode
-                if colors_diffs[j-start-1]:
-                    string += fco(self.pixels[i*2,j], self.pixels[i*2+1,j]) + '▀'
-                else:
-                    string += '▀'
-            # while loop ize ^^^
-
-            #Logger.log(f"[CameraFrame/render]: str construction: {perf_counter()-start_time_2:4f}")
-            # go to coordinates in terminal, and print the string
-            # terminal coordinates: start, i
-            
-            #Logger.log_on_screen(stuff.term, f"[CameraFrame/render]: printing@{int(start) + self.pos[0]}, {i + self.pos[1]//2} for len {end-start+1}")
-            #Logger.log_on_screen(stuff.term, f"[CameraFrame/render]: printing@{int(start) + self.pos[0]},{i + self.pos[1]//2}: \x1b[0m[{string}\x1b[0m]")
-            #start_time_2 = perf_counter()
-           # print3(stuff.term.move_xy(int(start)+self.pos[0], i+self.pos[1]//2) + string)
-            #print_buffer.append(((int(start)+self.pos[0], i+self.pos[1]//2), string))
-            final_string += string
-            i += 1
-            #Logger.log(f"[CameraFrame/render]: strlen={len(string)}: {perf_counter()-start_time_2:4f}")
+        self.snapped_to = None
+        np.minimum(self.dirty_x0[y1:y2], x1, out=self.dirty_x0[y1:y2])
+        np.maximum(self.dirty_x1[y1:y2], x2, out=self.dirty_x1[y1:y2])
+        
+    def _reset_dirty(self, base_color: RGBTuple | None) -> None:
+        """ Called when the whole frame gets set to one color: nothing is dirty anymore. """
+        self.dirty_x0[:] = self.width
+        self.dirty_x1[:] = 0
+        self.base_color = None if base_color is None else tuple(int(c) for c in base_color)
+        self.snapped_to = None
+        
+    def _apply_color_mode(self) -> None:
+        """ In the palette color modes (see `TermState.color_mode`), snaps every pixel to its palette color before rendering.
+        After that, pixels that map to the same palette color are equal, so diffing the frames compares palette indices.
+        Only happens once per drawing: rendering the same frame again (e.g. `render` then `render_full`) doesn't re-snap it. """
+        color_mode = stuff.term_state.color_mode
+        if color_mode == "truecolor" or self.snapped_to == color_mode:
+            return
         
-        # combine all the print calls into a single call
-        #for coords, string in print_buffer:
-        #    final_string += stuff.term.move_xy(*coords) + string
-            
-        print3(final_string)
+        snap_to_palette(self.pixels, color_mode)
+        if self.base_color is not None:
+            base = np.array([self.base_color], dtype=np.uint8)
+            snap_to_palette(base, color_mode)
+            self.base_color = tuple(base[0].tolist())
+        self.snapped_to = color_mode
+        
+    def _diff_reference(self, prev_frame: "CameraFrame", tolerance: int) -> Tuple[np.ndarray, int, bool]:
+        """ Picks what this frame gets diffed against. Returns (reference pixels, tolerance, compare_all).
+        
+        Normally that's `prev_frame`, exactly. With a tolerance, small differences don't get printed, so the screen can end up
+        slightly different from `prev_frame` - those frames get diffed against what's actually on the screen instead
+        (`stuff.term_state.screen`), which keeps the error from adding up over frames. When the tolerance goes below what the
+        screen might be off by in this frame's area (`screen_error`), e.g. back to 0, the whole frame gets compared
+        (`compare_all`), so every cell that's now too far off gets refreshed. """
+        
+        screen, error = stuff.term_state.screen_view(self.pos, self.width, self.height)
+        worst = int(error.max()) if error.size > 0 else 0
+        if worst == UNKNOWN_ERROR:
+            return prev_frame.pixels, 0, False # exact, then the whole frame gets synced into the screen memory
+        if tolerance == 0 and worst == 0:
+            return prev_frame.pixels, 0, False # the screen shows prev_frame exactly, and the frames know their dirty regions
+        return screen, tolerance, tolerance < worst
+    
+    def _sync_screen(self) -> None:
+        """ Call after this whole frame is exactly what's on the screen: copies it into `stuff.term_state.screen`. """
+        screen, error = stuff.term_state.screen_view(self.pos, self.width, self.height)
+        screen[:, :] = self.pixels
+        error[:, :] = 0
+    
+    def _remember_screen(self, rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, tolerance: int) -> None:
+        """ Updates `stuff.term_state.screen` after printing the spans (same as in `_print_spans`) of this frame. """
         
-        #Logger.log(f"[CameraFrame/render]: print to terminal: {perf_counter()-start_time:4f}")
+        if tolerance == 0:
+            # every cell that's different got printed, so the screen is exactly this frame now
+            self._sync_screen()
+            return
+        
+        screen, error = stuff.term_state.screen_view(self.pos, self.width, self.height)
+        
+        marks = np.zeros((self.height//2, self.width+1), dtype=np.int32)
+        np.add.at(marks, (rows, starts), 1)
+        np.add.at(marks, (rows, ends+1), -1)
+        printed = np.cumsum(marks, axis=1)[:, :-1] > 0
+        np.copyto(screen, self.pixels, where=np.repeat(printed, 2, axis=0)[:, :, np.newaxis])
+        
+        # the rest is within tolerance: either it got compared, or it was already (otherwise it'd be compare_all)
+        error[:, :] = np.where(printed, 0, tolerance)
+        
+    def _diff_cells(
+        self, prev_frame: "CameraFrame", reference: np.ndarray | None = None, 
+        tolerance: int = 0, compare_all: bool = False
+        ) -> Tuple[np.ndarray, int, np.ndarray]:
+        """ Diffs this frame against `prev_frame`, but only where either of them was drawn on - everywhere else both frames
+        are still their (shared) base color. Falls back to diffing the whole frame if the base colors aren't the same.
+        
+        Returns (rows, col_offset, cell_diffs): `cell_diffs` (see `get_cell_diffs`) only covers the character rows `rows`
+        and starts at column `col_offset`.
+        
+        If a `TileHasher` is plugged into `stuff.term_state.tiles`, that gets used instead: only tiles whose digest
+        changed since the last rendered frame get diffed.
+        
+        Optional (see `_diff_reference`):
+        - `reference`: pixels to actually compare against (default: `prev_frame.pixels`). `prev_frame` still decides where to look.
+        - `tolerance`: see `get_cell_diffs`.
+        - `compare_all`: compare every cell, not just the dirty ones. """
+        
+        if reference is None:
+            reference = prev_frame.pixels
+        
+        tiles = stuff.term_state.tiles
+        if tiles is not None:
+            changed_tiles = tiles.update(self.pixels, self.pos)
+            
+            if not compare_all:
+                cell_diffs = np.zeros((self.height//2, self.width), dtype=bool)
+                for y1, y2, x1, x2 in tiles.changed_bands(changed_tiles):
+                    cell_diffs[y1//2:y2//2, x1:x2] = get_cell_diffs(self.pixels[y1:y2, x1:x2], reference[y1:y2, x1:x2], tolerance)
+                return np.arange(self.height//2), 0, cell_diffs
+        
+        if (
+            compare_all or self.base_color is None or self.base_color != prev_frame.base_color 
+            or self.pixels.shape != prev_frame.pixels.shape
+        ):
+            return np.arange(self.height//2), 0, get_cell_diffs(self.pixels, reference, tolerance)
+        
+        # union of both frames' dirty regions, per row of characters
+        x0 = np.minimum(self.dirty_x0, prev_frame.dirty_x0)
+        x1 = np.maximum(self.dirty_x1, prev_frame.dirty_x1)
+        x0 = np.minimum(x0[0::2], x0[1::2])
+        x1 = np.maximum(x1[0::2], x1[1::2])
+        
+        rows = np.flatnonzero(x1 > x0)
+        if len(rows) == 0:
+            return rows, 0, np.zeros((0, self.width), dtype=bool)
+        
+        col_start, col_end = int(x0[rows].min()), int(x1[rows].max())
+        pixel_rows = np.stack((rows*2, rows*2+1), axis=1).ravel()
+        
+        cell_diffs = get_cell_diffs(
+            self.pixels[pixel_rows, col_start:col_end],
+            reference[pixel_rows, col_start:col_end],
+            tolerance
+        )
+        return rows, col_start, cell_diffs
     
-    # similar to func above, but should be rendering even less (only intervals of diffs, not first change -> last change)
-    # so idk why tf this one is so much slower
-    def render_intervaled(self, prev_frame: "CameraFrame") -> None:
+    def _encode_spans(self, buffer: OutputBuffer, rows: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Tuple[int, int]:
+        """ Encodes the given spans (see `_print_spans`) into `buffer`, after whatever is already in there.
+        Updates the cursor and colors of `stuff.term_state` like printing them would. Returns (sgr sequences, cursor moves). """
+        
+        # colors and cursor position the terminal was left with after the last frame
+        state = stuff.term_state
+        
+        # encode every dirty span in one go (no per-pixel python), then stitch them together with the cursor moves
+        data, span_offsets, (fg, bg) = encode_spans(
+            self.pixels, rows, starts, ends, state.fg, state.bg, state.color_mode, state.rep_threshold, state.pick_glyphs
+        )
+        span_offsets = span_offsets.tolist()
+        
+        moves = 0
+        for k, (i, start, end) in enumerate(zip(rows.tolist(), starts.tolist(), ends.tolist())):
+            move = state.move_to(start+self.pos[0], i+self.pos[1]//2)
+            moves += len(move) > 0
+            buffer.write(move)
+            buffer.write(data[span_offsets[k]:span_offsets[k+1]])
+            state.advance(end-start+1)
+        state.fg, state.bg = fg, bg
+        return count_sgr(data), moves
+    
+    def _print_spans(
+        self, rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, renderer: str, diff_start: float | None = None,
+        alternatives: Tuple[Tuple[np.ndarray, np.ndarray, np.ndarray], ...] = ()
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Prints the given spans of the frame: span k is the cells `starts[k]` -> `ends[k]` (inclusive) of character row `rows[k]`.
+        Spans should be ordered by row, then by start. Uses (and updates) `stuff.term_state` so colors and cursor moves
+        carry over from the last frame.
+        
+        `alternatives`: other (rows, starts, ends) that also cover every changed cell. All of them get encoded,
+        and whichever takes the fewest bytes gets printed. Returns the spans that got printed.
+        
+        If metrics are on, records the frame as `renderer`, with the time since `diff_start` (a `perf_counter()` time)
+        as its diff time. """
+        
+        state = stuff.term_state
+        time_encode = perf_counter()
+        
+        before = (state.cursor, state.fg, state.bg)
+        state.buffer.clear()
+        sgr, moves = self._encode_spans(state.buffer, rows, starts, ends)
+        
+        after = (state.cursor, state.fg, state.bg)
+        for alternative in alternatives:
+            state.cursor, state.fg, state.bg = before
+            state.spare_buffer.clear()
+            alternative_stats = self._encode_spans(state.spare_buffer, *alternative)
+            if state.spare_buffer.length < state.buffer.length:
+                state.buffer, state.spare_buffer = state.spare_buffer, state.buffer
+                (rows, starts, ends), (sgr, moves) = alternative, alternative_stats
+                after = (state.cursor, state.fg, state.bg)
+        state.cursor, state.fg, state.bg = after
+            
+        # single os.write of raw bytes. no reset code at the end, the next frame picks up where this one left off
+        time_write = perf_counter()
+        n_bytes = state.flush()
+        
+        if state.metrics is not None:
+            state.metrics.record(
+                renderer, time_encode-diff_start if diff_start is not None else 0, time_write-time_encode, perf_counter()-time_write,
+                len(np.unique(rows)), int((ends-starts+1).sum()), sgr, moves, n_bytes
+            )
+        return rows, starts, ends
+
+    # XXX - main render func
+    def render(self, prev_frame: "CameraFrame", tolerance: int = 0) -> None:
         """ Prints the frame to the screen.
-        Optimized by only printing the changes from the previous frame. """
+        Optimized by only printing the changes from the previous frame.
         
-        final_string = ""
+        With a `tolerance`, pixels whose color is at most that (perceptually, see `get_cell_diffs`) far from what's on the
+        screen don't get printed - less output, slightly wrong colors. The error never goes over the tolerance, since
+        frames get compared with what was actually printed (see `_diff_reference`). """
+        
+        time_start = perf_counter()
+        self._apply_color_mode()
+        reference, tolerance, compare_all = self._diff_reference(prev_frame, tolerance)
+        
+        # one diff over the dirty part of the frame: first/last changed column for every row of characters (-1 if unchanged)
+        rows, col_offset, cell_diffs = self._diff_cells(prev_frame, reference, tolerance, compare_all)
+        starts, ends = get_diff_bounds(cell_diffs)
+        
+        changed = np.flatnonzero(starts != -1)
+        rows, starts, ends = rows[changed], starts[changed]+col_offset, ends[changed]+col_offset
+        self._print_spans(rows, starts, ends, "render", time_start)
+        self._remember_screen(rows, starts, ends, tolerance)
+    
+    # similar to func above, but only renders the intervals of diffs (not first change -> last change).
+    # it used to be way slower since every tiny interval paid for a full cursor move + fresh color codes,
+    # now gaps between intervals get repainted whenever that's cheaper than jumping over them.
+    def render_intervaled(self, prev_frame: "CameraFrame", tolerance: int = 0) -> None:
+        """ Prints the frame to the screen.
+        Optimized by only printing the changes from the previous frame, and per row choosing between
+        jumping over unchanged gaps and repainting them (whichever takes fewer bytes).
+        
+        `tolerance`: same as in `render`. """
+        
+        time_start = perf_counter()
+        self._apply_color_mode()
+        reference, tolerance, compare_all = self._diff_reference(prev_frame, tolerance)
+        
+        # (row, start -> end) of every interval on which the frame is different from the previous frame, found in one pass.
+        # Only render pixels along these intervals. (end is exclusive)
+        dirty_rows, col_offset, cell_diffs = self._diff_cells(prev_frame, reference, tolerance, compare_all)
+        rows, starts, ends = get_frame_diff_intervals(cell_diffs)
+        rows, starts, ends = dirty_rows[rows], starts+col_offset, ends+col_offset
+        intervals = (rows, starts, ends-1)
+        
+        # first change -> last change of every row, what `render` would print
+        row_firsts = np.flatnonzero(np.diff(rows, prepend=-1))
+        row_lasts = np.append(row_firsts, len(rows))[1:] - 1
+        full_rows = (rows[row_firsts], starts[row_firsts], ends[row_lasts]-1)
+        
+        # merge intervals whenever repainting the gap between them is cheaper than a cursor move
+        state = stuff.term_state
+        rows, starts, ends = bridge_gaps(self.pixels, rows, starts, ends, state.color_mode, state.rep_threshold, state.pick_glyphs)
+        
+        # bridge_gaps decides every gap on its own, and how many bytes a gap really takes depends on the colors/glyphs
+        # around it, so it can miss. if it did anything, also try what render would print and the plain intervals,
+        # and print the shortest - never more bytes than either of those
+        alternatives = []
+        if len(rows) > len(row_firsts):
+            alternatives.append(full_rows)
+        if len(rows) < len(intervals[0]):
+            alternatives.append(intervals)
+        rows, starts, ends = self._print_spans(rows, starts, ends-1, "render_intervaled", time_start, tuple(alternatives))
+        self._remember_screen(rows, starts, ends, tolerance)
 
-        i = 0
-        for top_row_index in range(0, self.height, 2):       
-            row1_diff_intervals = get_diff_intervals(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            row2_diff_intervals = get_diff_intervals(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            combined_intervals: List[Tuple[int, int]] = combine_intervals(*row1_diff_intervals, *row2_diff_intervals)
-            """ List of (starts -> ends) on which this strip of pixels is different from the previous frame. 
-            Only render pixels along these intervals. """
-            
-            if len(combined_intervals) == 0: # if there are no differences, skip this row
-                i += 1
+    def render_parallel(self, prev_frame: "CameraFrame", band_encoder: "BandEncoder", tolerance: int = 0) -> None:
+        """ Same output as `render` (`tolerance` works the same too), but the frame gets split into horizontal bands that are
+        diffed and encoded by a pool of processes (see `BandEncoder`), then written in one go. For big frames with lots of motion. """
+
+        time_start = perf_counter()
+        self._apply_color_mode()
+        
+        state = stuff.term_state
+        # the workers always diff every cell of their band, so compare_all is a given
+        reference, tolerance, _ = self._diff_reference(prev_frame, tolerance)
+        results = band_encoder.encode(
+            self.pixels, reference, self.pos, state.width, state.color_mode, state.rep_threshold, state.pick_glyphs, tolerance
+        )
+
+        buffer = state.buffer
+        buffer.clear()
+        totals = np.zeros(4, dtype=np.int64)
+        for data, cursor, fg, bg, stats, _ in results:
+            totals += stats
+            if len(data) == 0:
                 continue
-            
-            color_strip = self.pixels[i*2:i*2+2,:]
-            colors_diffs = np.any(color_strip[:, 1:] != color_strip[:, :-1], axis=(0, 2))
-            """ [diff(1, 0), diff(2, 1), ...]. True if different, False if same. """
+            # every band starts with an absolute move + full colors, so it doesn't matter what came before it
+            buffer.write(data)
+            state.cursor, state.fg, state.bg = cursor, fg, bg
 
-            for interval in combined_intervals:
-                
-                start, end = interval
-                # end is exclusive
-                
-                # goto the start of the interval
-                final_string += stuff.term.move_xy(start+self.pos[0], i+self.pos[1]//2)
-                
-                # add the first pixel
-                string = fco(self.pixels[i*2,start], self.pixels[i*2+1,start]) + '▀'
+        if state.tiles is not None:
+            state.tiles.forget(self.pos, self.width, self.height) # the digests didn't see this frame
 
-                for j in range(start+1, end):
-                    # if colors_diffs is True for the current pixel, that means the colors are different from the previous pixel
-                    # in that case we have to re-fcode
-                    if colors_diffs[j-1]:
-                        string += fco(self.pixels[i*2,j], self.pixels[i*2+1,j]) + '▀'
-                    else:
-                        string += '▀'
-               
-                final_string += string
-                
-            i += 1
-            #Logger.log(f"[CameraFrame/render]: strlen={len(string)}: {perf_counter()-start_time_2:4f}")
-        
-        # combine all the print calls into a single call
-        #for coords, string in print_buffer:
-        #    final_string += stuff.term.move_xy(*coords) + string
-            
-        print3(final_string)
+        time_write = perf_counter()
+        n_bytes = state.flush()
+        if state.metrics is not None:
+            # diff + encode happen together in the workers, so all of it counts as encode time
+            state.metrics.record("render_parallel", 0, time_write-time_start, perf_counter()-time_write, *totals.tolist(), n_bytes)
+        rows, starts, ends = (np.concatenate(parts) for parts in zip(*(spans for *_, spans in results)))
+        self._remember_screen(rows, starts, ends, tolerance)
+
+    def _record_legacy(
+        self, renderer: str, starts: np.ndarray, ends: np.ndarray, printed: str,
+        time_start: float, time_encode: float, time_write: float
+        ) -> None:
+        """ Records a frame from one of the old renderers below into `stuff.term_state.metrics` (if it's on).
+        They all diff with `get_frame_diff_bounds`, print one cursor move per changed row and send everything through
+        a single `print3(printed)`, so the counts can be worked out from that. """
         
-        #Logger.log(f"[CameraFrame/render]: print to terminal: {perf_counter()-start_time:4f}")
-    
+        metrics = stuff.term_state.metrics
+        if metrics is None:
+            return
+        written = printed + '\r\x1b[0m' # print3 adds the reset
+        changed = starts != -1
+        rows = int(np.count_nonzero(changed))
+        metrics.record(
+            renderer, time_encode-time_start, time_write-time_encode, perf_counter()-time_write,
+            rows, int((ends-starts+1)[changed].sum()), written.count('m'), rows, len(written.encode())
+        )
+
     def render_bufferlist(self, prev_frame: "CameraFrame") -> None:
         """ Prints the frame to the screen.
         Optimized by only printing the changes from the previous frame. """
         
+        time_start = perf_counter()
+        
         indices_to_print = []
         """ Should end up being a list of tuples (start, end) 
         where start and end are the first and last changed "pixels columns" (characters) in a row. """
 
-        for top_row_index in range(0, self.height, 2):       
-            first_diff_row1 = first_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            first_diff_row2 = first_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            last_diff_row1 = last_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            last_diff_row2 = last_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            print_start = lesser(first_diff_row1, first_diff_row2)
-            print_end = greater(last_diff_row1, last_diff_row2)
-            
-            #Logger.log(f"[CameraFrame/render]: Appending ({print_start}, {print_end}) to indices_to_print, which currently has {len(indices_to_print)} elements (b4 adding)")
-            indices_to_print.append((print_start, print_end))
+        # diff the whole frame at once, then turn the start/end arrays into (start, end) tuples
+        starts, ends = get_frame_diff_bounds(self.pixels, prev_frame.pixels)
+        time_encode = perf_counter()
+        for print_start, print_end in zip(starts.tolist(), ends.tolist()):
+            if print_start == -1:
+                indices_to_print.append((None, None))
+            else:
+                indices_to_print.append((print_start, print_end))
         
         #Logger.log(f"[CameraFrame/render]: get indices to print: {1000*(perf_counter()-start_time):4f}ms")
         # printing the frame
@@ -342,7 +572,9 @@ class CameraFrame:
         for coords, string in print_buffer:
             final_string += stuff.term.move_xy(*coords) + string
             
+        time_write = perf_counter()
         print3(final_string)
+        self._record_legacy("render_bufferlist", starts, ends, final_string, time_start, time_encode, time_write)
         
         #Logger.log(f"[CameraFrame/render]: print to terminal: {perf_counter()-start_time:4f}")
     
@@ -350,28 +582,18 @@ class CameraFrame:
         """ Prints the frame to the screen.
         Optimized by only printing the changes from the previous frame. """
         
+        time_start = perf_counter()
+        
         final_string = ""
 
-        i = 0
-        for top_row_index in range(0, self.height, 2):       
-            first_diff_row1 = first_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            first_diff_row2 = first_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            last_diff_row1 = last_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            last_diff_row2 = last_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            print_start = lesser(first_diff_row1, first_diff_row2)
-            print_end = greater(last_diff_row1, last_diff_row2)
-            
-            start, end = print_start, print_end
-            
-            # if both are None, that means the rows were the exact same, so we don't need to print anything
-            if start is None and end is None:
-                #Logger.log(f"Skipping row {i} since it's the same as the previous row!")
-                i += 1
-                continue
+        # one diff over the whole frame: first/last changed column for every row of characters (-1 if unchanged)
+        starts, ends = get_frame_diff_bounds(self.pixels, prev_frame.pixels)
+        time_encode = perf_counter()
+        
+        for i in np.flatnonzero(starts != -1).tolist():
+            start, end = int(starts[i]), int(ends[i])
 
-            final_string += stuff.term.move_xy(int(start)+self.pos[0], i+self.pos[1]//2)
+            final_string += stuff.term.move_xy(start+self.pos[0], i+self.pos[1]//2)
             string = ""
             # get a numpy array of which indices are repeat colors (so we can skip fcode)
             color_strip = self.pixels[i*2:i*2+2, start:end+1]
@@ -418,14 +640,15 @@ class CameraFrame:
            # print3(stuff.term.move_xy(int(start)+self.pos[0], i+self.pos[1]//2) + string)
             #print_buffer.append(((int(start)+self.pos[0], i+self.pos[1]//2), string))
             final_string += string
-            i += 1
             #Logger.log(f"[CameraFrame/render]: strlen={len(string)}: {perf_counter()-start_time_2:4f}")
         
         # combine all the print calls into a single call
         #for coords, string in print_buffer:
         #    final_string += stuff.term.move_xy(*coords) + string
             
+        time_write = perf_counter()
         print3(final_string)
+        self._record_legacy("render_usingwhile", starts, ends, final_string, time_start, time_encode, time_write)
     
     # experimental, isnt working (but kinda close to, but i have no time to fix)
     def render2_usingdists(self, prev_frame: "CameraFrame") -> None:
@@ -444,18 +667,14 @@ class CameraFrame:
         
         #Logger.log(f"CF render begin -------------------------------")
         
-        for top_row_index in range(0, self.height, 2):       
-            first_diff_row1 = first_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            first_diff_row2 = first_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            last_diff_row1 = last_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            last_diff_row2 = last_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            print_start = lesser(first_diff_row1, first_diff_row2)
-            print_end = greater(last_diff_row1, last_diff_row2)
-            
-            #Logger.log(f"[CameraFrame/render]: Appending ({print_start}, {print_end}) to indices_to_print, which currently has {len(indices_to_print)} elements (b4 adding)")
-            indices_to_print.append((print_start, print_end))
+        # diff the whole frame at once, then turn the start/end arrays into (start, end) tuples
+        starts, ends = get_frame_diff_bounds(self.pixels, prev_frame.pixels)
+        time_encode = perf_counter()
+        for print_start, print_end in zip(starts.tolist(), ends.tolist()):
+            if print_start == -1:
+                indices_to_print.append((None, None))
+            else:
+                indices_to_print.append((print_start, print_end))
         
         #Logger.log(f"[CameraFrame/render]: get indices to print: {1000*(perf_counter()-start_time):4f}ms")
         # printing the frame
@@ -521,7 +740,9 @@ class CameraFrame:
         for coords, string in print_buffer:
             final_string += stuff.term.move_xy(*coords) + string
             
+        time_write = perf_counter()
         print3(final_string)
+        self._record_legacy("render2_usingdists", starts, ends, final_string, start_time, time_encode, time_write)
         
         #Logger.log(f"[CameraFrame/render]: print to terminal: {perf_counter()-start_time:4f}")
            
@@ -542,18 +763,14 @@ class CameraFrame:
         
         #Logger.log(f"CF render begin -------------------------------")
         
-        for top_row_index in range(0, self.height, 2):       
-            first_diff_row1 = first_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            first_diff_row2 = first_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            last_diff_row1 = last_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            last_diff_row2 = last_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            print_start = lesser(first_diff_row1, first_diff_row2)
-            print_end = greater(last_diff_row1, last_diff_row2)
-            
-            #Logger.log(f"[CameraFrame/render]: Appending ({print_start}, {print_end}) to indices_to_print, which currently has {len(indices_to_print)} elements (b4 adding)")
-            indices_to_print.append((print_start, print_end))
+        # diff the whole frame at once, then turn the start/end arrays into (start, end) tuples
+        starts, ends = get_frame_diff_bounds(self.pixels, prev_frame.pixels)
+        time_encode = perf_counter()
+        for print_start, print_end in zip(starts.tolist(), ends.tolist()):
+            if print_start == -1:
+                indices_to_print.append((None, None))
+            else:
+                indices_to_print.append((print_start, print_end))
         
         #Logger.log(f"[CameraFrame/render]: get indices to print: {1000*(perf_counter()-start_time):4f}ms")
         # printing the frame
@@ -623,7 +840,9 @@ class CameraFrame:
         for coords, string in print_buffer:
             final_string += stuff.term.move_xy(*coords) + string
             
+        time_write = perf_counter()
         print3(final_string)
+        self._record_legacy("render3_iterpixelidxs", starts, ends, final_string, start_time, time_encode, time_write)
         
         #Logger.log(f"[CameraFrame/render]: print to terminal: {perf_counter()-start_time:4f}")
     
@@ -633,70 +852,57 @@ class CameraFrame:
         
         self.initialized_colors = set()
         
-        #indices_to_print = []
-        #""" Should end up being a list of tuples (start, end) 
-        #where start and end are the first and last changed "pixels columns" (characters) in a row. """
-        
         # compare the curr frame with the previous frame
-        # for each pair of rows, find the first and last changed column
-        # multiply term height by 2 since chars are 2 pixels tall
-        for top_row_index in range(0, self.height, 2):       
-            #first_diff_row1 = first_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            #first_diff_row2 = first_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            #last_diff_row1 = last_diff_color(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            #last_diff_row2 = last_diff_color(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            row1_diff_intervals = get_diff_intervals(self.pixels[top_row_index], prev_frame.pixels[top_row_index])
-            row2_diff_intervals = get_diff_intervals(self.pixels[top_row_index+1], prev_frame.pixels[top_row_index+1])
-            
-            combined_intervals: List[Tuple[int, int]] = combine_intervals(*row1_diff_intervals, *row2_diff_intervals)
-            
-            #Logger.log(f"combined intervals: {combined_intervals}")
+        # (row, start -> end) of every interval of changed characters, for the whole frame at once
+        rows, starts, ends = get_frame_diff_intervals(get_cell_diffs(self.pixels, prev_frame.pixels))
+        
+        # render
+        for screen_y, interval_start, interval_end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+            top_row_index = screen_y * 2
+            # example interval: (17, 29)
             
-            # render
-            screen_y = top_row_index // 2
-            for interval in combined_intervals:
-                # example interval: (17, 29)
+            for j in range(interval_start, interval_end-1):
+                # calculate key of color
+                fg_grayscale_value = np.mean(self.pixels[top_row_index,j]) # 0-255
+                bg_grayscale_value = np.mean(self.pixels[top_row_index+1,j]) # 0-255
                 
-                for j in range(interval[0], interval[1]-1):
-                    # calculate key of color
-                    fg_grayscale_value = np.mean(self.pixels[top_row_index,j]) # 0-255
-                    bg_grayscale_value = np.mean(self.pixels[top_row_index+1,j]) # 0-255
-                    
-                    # scale each down to 0-15 (from 0-255)
-                    scaled_fg = int(fg_grayscale_value / 255 * 15)
-                    scaled_bg = int(bg_grayscale_value / 255 * 15)
-                    
-                    # combine into 8-bit number
-                    color_key = (scaled_fg << 4) + scaled_bg
-                    
-                    color_key = max(1, color_key) # cant use 0 lol
-                    
-                    if color_key not in self.initialized_colors:
-                        # initialize the color pair
-                        fg_1000_based = int(scaled_fg / 15 * 1000)
-                        bg_1000_based = int(scaled_bg / 15 * 1000)
-                        curses.init_color(scaled_fg << 4, fg_1000_based, fg_1000_based, fg_1000_based)
-                        curses.init_color(scaled_bg, bg_1000_based, bg_1000_based, bg_1000_based)
-                        Logger.log(f"attempting to init color pair {color_key} with fg {scaled_fg << 4} and bg {scaled_bg}")
-                        curses.init_pair(color_key, scaled_fg << 4, scaled_bg)
-                        self.initialized_colors.add(color_key)   
-                    #string = "▀"                 
-                    
-                    #Logger.log(f"(render) at yx {screen_y}, {j} string of len 1")
-                    stuff.screen.addch(screen_y, j, "▀", curses.color_pair(color_key))
-            
-            #Logger.log(f"[CameraFrame/render]: Appending ({print_start}, {print_end}) to indices_to_print, which currently has {len(indices_to_print)} elements (b4 adding)")
-            #indices_to_print.append((print_start, print_end))
+                # scale each down to 0-15 (from 0-255)
+                scaled_fg = int(fg_grayscale_value / 255 * 15)
+                scaled_bg = int(bg_grayscale_value / 255 * 15)
+                
+                # combine into 8-bit number
+                color_key = (scaled_fg << 4) + scaled_bg
+                
+                color_key = max(1, color_key) # cant use 0 lol
+                
+                if color_key not in self.initialized_colors:
+                    # initialize the color pair
+                    fg_1000_based = int(scaled_fg / 15 * 1000)
+                    bg_1000_based = int(scaled_bg / 15 * 1000)
+                    curses.init_color(scaled_fg << 4, fg_1000_based, fg_1000_based, fg_1000_based)
+                    curses.init_color(scaled_bg, bg_1000_based, bg_1000_based, bg_1000_based)
+                    Logger.debug("attempting to init color pair %s with fg %s and bg %s", color_key, scaled_fg << 4, scaled_bg)
+                    curses.init_pair(color_key, scaled_fg << 4, scaled_bg)
+                    self.initialized_colors.add(color_key)   
+                #string = "▀"                 
+                
+                #Logger.log(f"(render) at yx {screen_y}, {j} string of len 1")
+                stuff.screen.addch(screen_y, j, "▀", curses.color_pair(color_key))
         
         Logger.log(f"(render) refreshing curses screen")
         stuff.screen.refresh()
     
+    def clear(self, color: RGBTuple = (0, 0, 0)) -> None:
+        """ Resets every pixel of the frame to `color` (default black), in place - no new arrays get allocated,
+        so a frame can be cleared and redrawn every tick instead of creating a new CameraFrame. """
+        self.pixels[:, :] = color
+        self._reset_dirty(color)
+    
     def fill(self, color: RGBTuple) -> None:
         """ Fills the entire canvas with the given color. RGB (3-tuple) required. Should be pretty efficient because of numpy. """
         assert len(color) == 3, f"[FrameLayer/fill]: color must be an rgb (3 ints) tuple, instead got {color}"
         self.pixels[:,:] = color
+        self._reset_dirty(color)
         
     def fill_with_gradient(
         self, 
@@ -720,6 +926,9 @@ class CameraFrame:
             
             for i in range(self.width):
                 self.pixels[:,i] = gradient
+        
+        # not one color anymore, so everything counts as dirty
+        self._reset_dirty(None)
 
     Anchor = Literal[
         "top-left", 
@@ -827,6 +1036,7 @@ class CameraFrame:
                 clipped_x1:clipped_x2
             ], clipped_rect_as_pixels
         )
+        self.mark_dirty(clipped_x1, clipped_y1, clipped_x2, clipped_y2)
         
     def add_pixels_topleft(self, x: int, y: int, pixels: np.ndarray) -> None:
         """ Same as add_pixels, but with the anchor set to top-left. mainly for optimization. """
@@ -853,6 +1063,7 @@ class CameraFrame:
             self.pixels[int(clipped_y1):int(clipped_y1+pixels.shape[0]-offset_y1), int(clipped_x1):int(clipped_x1+pixels.shape[1]-offset_x1)],
             pixels[int(offset_y1):self.height, int(offset_x1):self.width]
         )
+        self.mark_dirty(clipped_x1, clipped_y1, clipped_x1+pixels.shape[1]-offset_x1, clipped_y1+pixels.shape[0]-offset_y1)
     
     def add_pixels_centered_at(self, x: int, y: int, pixels: np.ndarray) -> None:
         """ Adds a set of pixels to the frame, with the center at the given position. """
@@ -893,13 +1104,56 @@ class CameraFrame:
             self.pixels[clipped_top:int(clipped_top+pixels.shape[0]-offset_top), clipped_left:int(clipped_left+pixels.shape[1]-offset_left)],
             pixels[offset_top:, offset_left:]
         )
+        self.mark_dirty(clipped_left, clipped_top, clipped_left+pixels.shape[1]-offset_left, clipped_top+pixels.shape[0]-offset_top)
     
     def add_line(self, pos1: Tuple[int, int], pos2: Tuple[int, int], color: RGBTuple) -> None:
         """ Draws a non-antialiased, 1-wide line between two points on the frame. """
         draw_line(self.pixels, pos1, pos2, color)
+        # draw_line puts a disk of radius 1 on every point of the line, and clamps offscreen points to the edges
+        xs = np.clip((pos1[0], pos2[0]), 0, self.width-1)
+        ys = np.clip((pos1[1], pos2[1]), 0, self.height-1)
+        self.mark_dirty(xs.min()-1, ys.min()-1, xs.max()+2, ys.max()+2)
+    
+    def quantize(self, bits: int) -> None:
+        """ Keeps only the top `bits` bits of every color channel (8 = no change), in place. Fewer distinct colors means
+        more neighbouring cells share a color, so fewer color codes have to be printed. """
+        if bits >= 8:
+            return
+        mask = (0xff << (8-bits)) & 0xff
+        half = 1 << (7-bits) # middle of the range that got cut off, so the image doesn't get darker
+        np.bitwise_and(self.pixels, mask, out=self.pixels)
+        np.bitwise_or(self.pixels, half, out=self.pixels)
+        self.snapped_to = None
+        if self.base_color is not None:
+            self.base_color = tuple((c & mask) | half for c in self.base_color)
+    
+    def pixelate(self, factor: int) -> None:
+        """ Lowers the resolution of the frame in place: every `factor` x `factor` block of pixels takes the color of its
+        top left pixel (1 = no change). Should be 1 or even, so blocks line up with characters. """
+        if factor <= 1:
+            return
+        assert factor % 2 == 0, f"[CameraFrame/pixelate]: factor must be 1 or even, instead got {factor}"
+        
+        small = self.pixels[::factor, ::factor]
+        self.pixels[:, :] = np.repeat(np.repeat(small, factor, axis=0), factor, axis=1)[:self.height, :self.width]
+        self.snapped_to = None
+        
+        # the dirty region grows to whole blocks
+        padded_height = -(-self.height // factor) * factor
+        x0 = np.full(padded_height, self.width, dtype=np.int32)
+        x1 = np.zeros(padded_height, dtype=np.int32)
+        x0[:self.height], x1[:self.height] = self.dirty_x0, self.dirty_x1
+        x0 = x0.reshape(-1, factor).min(axis=1) // factor * factor
+        x1 = -(-x1.reshape(-1, factor).max(axis=1) // factor) * factor
+        self.dirty_x0[:] = np.repeat(x0, factor)[:self.height]
+        self.dirty_x1[:] = np.minimum(np.repeat(x1, factor)[:self.height], self.width)
     
     def copy(self) -> "CameraFrame":
         """ Returns a deep copy of this CameraFrame. (except for the terminal reference) """
         new_frame = CameraFrame((self.width, self.height), self.pos)
         new_frame.pixels = np.copy(self.pixels)
+        new_frame.dirty_x0 = np.copy(self.dirty_x0)
+        new_frame.dirty_x1 = np.copy(self.dirty_x1)
+        new_frame.base_color = self.base_color
+        new_frame.snapped_to = self.snapped_to
         return new_frame
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+Pre-encoded playback for prerecorded video: the renderer's output for every frame, compiled once into a file.
+
+Diffing and encoding a video gives the same bytes every run, so `compile_stream` runs the renderer once, offline,
+and stores each frame's output (the delta from the frame before it). Playing it back is then just writing byte ranges
+out of a memory-mapped file on schedule - no decoding, no diffing, no encoding.
+
+Every `keyframe_interval` frames there's also a keyframe: the whole frame (`CameraFrame.render_full`), which doesn't
+depend on what was on the screen before. Seeking = keyframe at or before the frame + the deltas after it.
+
+    python delta_stream.py compile badapple72p.mp4 badapple.deltas --size W H --grayscale
+    python delta_stream.py play badapple.deltas --start 60
+
+File layout (little endian):
+- header (`_HEADER`): magic, version, fps, width, height, number of frames, number of keyframes,
+offset of the delta index, offset of the keyframe table
+- deltas of every frame back to back (so any run of consecutive deltas is one contiguous byte range), then every keyframe
+- delta index: n_frames+1 uint64 offsets, delta i = bytes `offsets[i]` -> `offsets[i+1]`
+- keyframe table: frame index (uint32) of every keyframe, then n_keyframes+1 uint64 offsets (same idea as above)
+
+The bytes assume a terminal at least `width` wide, with the same capabilities it was compiled for (color mode, REP).
+"""
+
+import argparse
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from typing import Iterable, List
+import numpy as np
+
+from gd_constants import stuff
+from camera_frame import CameraFrame
+from term_state import TermState
+from output_buffer import OutputBuffer, write_all
+from frame_scheduler import FrameScheduler
+from palette import ColorMode
+
+_MAGIC = b'CHDELTAS'
+_VERSION = 1
+_HEADER = struct.Struct('<8sIdIIIIQQ')
+_DATA_OFFSET = 64
+
+class _Recorder:
+    """ Stands in for a `FrameWriter`: collects the flushed bytes instead of writing them, until `take()`n. """
+
+    def __init__(self) -> None:
+        self.data = b''
+
+    def submit(self, buffer: OutputBuffer) -> OutputBuffer:
+        self.data += bytes(buffer.getvalue())
+        buffer.clear()
+        return buffer
+
+    def drain(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data, self.data = self.data, b''
+        return data
+
+def compile_stream(
+    path: str, frames: Iterable[np.ndarray], fps: float, keyframe_interval: int = 60,
+    color_mode: ColorMode = "truecolor", rep_threshold: int | None = None, pick_glyphs: bool = True
+    ) -> "DeltaStream":
+    """
+    Renders `frames` (all the same (h, w, 3) shape, h even) and stores the output of every frame at `path`.
+    Returns the stream, opened.
+
+    Deltas are made with `CameraFrame.render` in a terminal model of its own (the global `stuff.term_state` gets swapped
+    out while this runs). Right after a keyframe, the model forgets the terminal's state, so the delta after it works
+    both after the delta before it (playing straight through) and after the keyframe (seeking).
+    """
+    recorder = _Recorder()
+    state = TermState(stuff.term)
+    state.writer = recorder
+    state.color_mode = color_mode
+    state.rep_threshold = rep_threshold
+    state.pick_glyphs = pick_glyphs
+
+    offsets = [_DATA_OFFSET]
+    keyframes: List[int] = []
+    keyframe_offsets = [0] # relative to the start of the keyframes, until they get moved after the deltas
+
+    saved_state = stuff.term_state
+    stuff.term_state = state
+    try:
+        with open(path, "wb") as f, tempfile.TemporaryFile() as keyframe_file:
+            f.write(b'\0' * _DATA_OFFSET) # header goes here once the counts are known
+            front = back = None
+            for i, pixels in enumerate(frames):
+                if front is None:
+                    height, width = pixels.shape[:2]
+                    state.width = width
+                    front, back = CameraFrame((width, height)), CameraFrame((width, height))
+
+                back.clear()
+                back.add_pixels_topleft(0, 0, pixels)
+                if i > 0:
+                    back.render(front)
+                    f.write(recorder.take())
+                offsets.append(f.tell())
+
+                if i % keyframe_interval == 0:
+                    back.render_full()
+                    data = recorder.take()
+                    keyframe_file.write(data)
+                    keyframes.append(i)
+                    keyframe_offsets.append(keyframe_offsets[-1] + len(data))
+                    if i == 0:
+                        # nothing before the first frame to make a delta from, so the keyframe is its delta too
+                        f.write(data)
+                        offsets[-1] = f.tell()
+                    state.invalidate()
+                    state.width = width # invalidate re-reads the real terminal's width, the stream has its own
+
+                front, back = back, front
+
+            keyframe_start = f.tell()
+            keyframe_file.seek(0)
+            shutil.copyfileobj(keyframe_file, f)
+
+            index_offset = f.tell()
+            f.write(np.array(offsets, dtype="<u8").tobytes())
+            keyframe_table_offset = f.tell()
+            f.write(np.array(keyframes, dtype="<u4").tobytes())
+            f.write((np.array(keyframe_offsets, dtype="<u8") + keyframe_start).tobytes())
+
+            width, height = (front.width, front.height) if front is not None else (0, 0)
+            f.seek(0)
+            f.write(_HEADER.pack(
+                _MAGIC, _VERSION, fps, width, height, len(offsets)-1, len(keyframes), index_offset, keyframe_table_offset
+            ))
+    finally:
+        stuff.term_state = saved_state
+
+    return DeltaStream(path)
+
+class DeltaStream:
+    """
+    Player side of a compiled stream: memory-maps the file and writes frames' bytes straight out of it.
+
+    Keeps track of which frame is on the screen (`shown`), since every delta only works on top of the frame before it.
+    Call `show(i)` for the frames to show, in order; skipping ahead is fine (see `show`).
+    """
+
+    def __init__(self, path: str, fd: int | None = None) -> None:
+        """ `fd`: where frames get written. Defaults to stdout. """
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self.map)
+
+        magic, version, fps, width, height, n_frames, n_keyframes, index_offset, keyframe_table_offset = \
+            _HEADER.unpack_from(self.map, 0)
+        assert magic == _MAGIC, f"[DeltaStream]: {path} isn't a compiled delta stream"
+        assert version == _VERSION, f"[DeltaStream]: {path} has version {version}, expected {_VERSION}"
+
+        self.fps: float = fps
+        self.width: int = width
+        self.height: int = height
+        self.offsets = np.frombuffer(self.map, dtype="<u8", count=n_frames+1, offset=index_offset)
+        """ Delta i is `data[offsets[i]:offsets[i+1]]`. """
+        self.keyframes = np.frombuffer(self.map, dtype="<u4", count=n_keyframes, offset=keyframe_table_offset)
+        """ Frame index of every keyframe, ascending. """
+        self.keyframe_offsets = np.frombuffer(self.map, dtype="<u8", count=n_keyframes+1, offset=keyframe_table_offset + 4*n_keyframes)
+
+        self.fd = fd if fd is not None else sys.stdout.fileno()
+        self.shown: int | None = None
+        """ Frame currently on the screen. None if unknown (nothing shown yet, or something else printed over it). """
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def fits(self, columns: int, rows: int) -> bool:
+        """ Whether the frames fit on a terminal of that size (in characters). The cursor moves in the stream are absolute,
+        so on a smaller terminal lines would wrap and the picture would fall apart. """
+        return self.width <= columns and self.height // 2 <= rows
+
+    def _deltas(self, first: int, last: int) -> memoryview:
+        """ Deltas of frames `first` -> `last` (inclusive), as one byte range. """
+        return self.data[self.offsets[first]:self.offsets[last+1]]
+
+    def ranges_for(self, i: int) -> List[memoryview]:
+        """ Byte ranges that take the screen from `shown` to frame i: either the deltas after `shown`, or the closest
+        keyframe at/before i + the deltas after it, whichever is fewer bytes. """
+        k = int(np.searchsorted(self.keyframes, i, side="right")) - 1
+        key = int(self.keyframes[k])
+        seek = [self.data[self.keyframe_offsets[k]:self.keyframe_offsets[k+1]]]
+        if key < i:
+            seek.append(self._deltas(key+1, i))
+
+        if self.shown is None or self.shown > i:
+            return seek
+        if self.shown == i:
+            return []
+        forward = [self._deltas(self.shown+1, i)]
+        return forward if len(forward[0]) <= sum(len(r) for r in seek) else seek
+
+    def show(self, i: int) -> int:
+        """ Puts frame i on the screen. If frames got skipped, their deltas still get written (or a keyframe, if that's
+        shorter), since every delta builds on the one before it - but it's all one write. Returns the number of bytes. """
+        ranges = self.ranges_for(i)
+        if len(ranges) == 1:
+            data = ranges[0] # straight out of the map, no copy
+        else:
+            data = b''.join(ranges) # keyframe + deltas after it
+        write_all(self.fd, data)
+        self.shown = i
+        return len(data)
+
+    def invalidate(self) -> None:
+        """ Forget what's on the screen, so the next `show` starts from a keyframe. """
+        self.shown = None
+
+    def close(self) -> None:
+        # the arrays + view borrow the map's memory, it can only be closed once they're gone
+        self.offsets = self.keyframes = self.keyframe_offsets = None
+        self.data.release()
+        self.map.close()
+        self.file.close()
+
+def play(path: str, start: float = 0, fd: int | None = None) -> FrameScheduler:
+    """ Plays a compiled stream at its fps, from `start` seconds in. Returns the scheduler (see `FrameScheduler.report`). """
+    stream = DeltaStream(path, fd)
+    scheduler = FrameScheduler(stream.fps)
+    try:
+        for i in scheduler.frames(len(stream), first=min(int(start * stream.fps), len(stream))):
+            stream.show(i)
+    finally:
+        stream.close()
+        stuff.term_state.invalidate() # colors + cursor are whatever the stream left them at
+    return scheduler
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compiles a video into a delta stream, or plays one (see delta_stream.py).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile")
+    compile_parser.add_argument("video")
+    compile_parser.add_argument("output")
+    compile_parser.add_argument("--fps", type=float, default=30)
+    compile_parser.add_argument("--size", type=int, nargs=2, default=(None, None), metavar=("W", "H"),
+        help="box in pixels to fit the frames in (e.g. terminal width, 2*terminal height)")
+    compile_parser.add_argument("--grayscale", action="store_true")
+    compile_parser.add_argument("--keyframe-interval", type=int, default=60)
+    compile_parser.add_argument("--color-mode", default="truecolor", choices=["truecolor", "256", "16"])
+    compile_parser.add_argument("--rep", action="store_true", help="use REP (only play it back on terminals that have it)")
+
+    play_parser = commands.add_parser("play")
+    play_parser.add_argument("stream")
+    play_parser.add_argument("--start", type=float, default=0, help="seconds into the video to start at")
+
+    args = parser.parse_args()
+    if args.command == "compile":
+        from vid_to_np import iter_frames
+        width, height = args.size
+        stream = compile_stream(
+            args.output, iter_frames(args.video, args.fps, width, height, args.grayscale), args.fps,
+            args.keyframe_interval, args.color_mode, 2 if args.rep else None
+        )
+        size = stream.offsets[-1] - stream.offsets[0]
+        print(
+            f"{len(stream)} frames ({len(stream.keyframes)} keyframes) of {stream.width}x{stream.height} at {stream.fps:g} fps,"
+            f" {size/max(len(stream), 1):.0f} bytes/frame -> {args.output}"
+        )
+        stream.close()
+    else:
+        stream = DeltaStream(args.stream)
+        fits = stream.fits(*shutil.get_terminal_size())
+        size = (stream.width, stream.height // 2)
+        stream.close()
+        if not fits:
+            print(f"{args.stream} needs a terminal of at least {size[0]}x{size[1]}")
+            return
+        
+        from cursor import hide, show
+        hide()
+        try:
+            scheduler = play(args.stream, args.start)
+        finally:
+            show()
+            print("\x1b[0m")
+        print(scheduler.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Vectorized ANSI encoder for the renderers in `camera_frame.py`.
+
+Instead of building the output one character at a time with `fcode_opt`, every cell being printed gets a
+fixed-width "template" row of bytes (escape codes + glyph), plus a mask of which of those bytes are actually used.
+Indexing the template with the mask gives the final byte stream, with no per-cell python code.
+"""
+
+from typing import Tuple
+import numpy as np
+from palette import ColorMode, palette_index_of
+
+HALF_BLOCK = '▀'.encode()
+""" Upper half block, utf-8 encoded. Top pixel is the fg color, bottom pixel is the bg color. """
+
+UPPER, LOWER, SPACE, FULL = 0, 1, 2, 3
+""" Glyph ids for `encode_cells`. """
+GLYPHS = [HALF_BLOCK, '▄'.encode(), b' ', '█'.encode()]
+""" utf-8 bytes of every glyph id: `▀` (fg on top), `▄` (fg on the bottom), space (only bg), `█` (only fg). """
+_GLYPH_LENS = np.array([len(g) for g in GLYPHS])
+
+def _make_dec_table() -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns (digits, mask): digits[v] is the decimal string of v (0-255), left-aligned in 3 bytes,
+    and mask[v] says which of those 3 bytes are used. """
+    digits = np.zeros((256, 3), dtype=np.uint8)
+    mask = np.zeros((256, 3), dtype=bool)
+    for v in range(256):
+        s = str(v).encode()
+        digits[v, :len(s)] = np.frombuffer(s, dtype=np.uint8)
+        mask[v, :len(s)] = True
+    return digits, mask
+
+_DEC_DIGITS, _DEC_MASK = _make_dec_table()
+
+def _dec_fields(values: np.ndarray, width: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """ Like `_DEC_DIGITS`/`_DEC_MASK` but for any ints up to `width` digits: returns (digits, mask), both (n, width). """
+    powers = 10 ** np.arange(width-1, -1, -1)
+    values = values[:, np.newaxis]
+    digits = (values // powers % 10 + ord('0')).astype(np.uint8)
+    mask = (values >= powers) | (powers == 1) # no leading zeros, but 0 is still "0"
+    return digits, mask
+
+def _literal(s: bytes, n: int) -> np.ndarray:
+    """ (n, len(s)) view of the bytes `s` repeated n times. """
+    return np.broadcast_to(np.frombuffer(s, dtype=np.uint8), (n, len(s)))
+
+def _color_fields(colors: np.ndarray, is_fg: bool, color_mode: ColorMode) -> Tuple[bytes, np.ndarray]:
+    """ How a color gets written in an SGR sequence: returns (prefix, values), where `values` is a (..., k) array of
+    numbers (0-255) that get written in decimal after the prefix, separated by `;`.
+    - truecolor: `38;2;r;g;b` / `48;2;r;g;b`
+    - 256: `38;5;n` / `48;5;n`
+    - 16: `30`-`37`, `90`-`97` / `40`-`47`, `100`-`107`
+    
+    In the palette modes, `colors` have to be palette colors already (see `palette.snap_to_palette`). """
+    
+    if color_mode == "truecolor":
+        return (b'38;2;' if is_fg else b'48;2;'), colors
+    
+    index = palette_index_of(colors, color_mode).astype(np.uint8)
+    if color_mode == "256":
+        return (b'38;5;' if is_fg else b'48;5;'), index[..., np.newaxis]
+    
+    # 16 colors: 0-7 are 30-37 (fg)/40-47 (bg), bright ones (8-15) are 90-97/100-107
+    base = np.where(index < 8, 30, 90-8) + (0 if is_fg else 10)
+    return b'', (base + index).astype(np.uint8)[..., np.newaxis]
+
+def encode_cells(
+    fg: np.ndarray, bg: np.ndarray, 
+    emit_fg: np.ndarray, emit_bg: np.ndarray, 
+    color_mode: ColorMode = "truecolor",
+    repeats: np.ndarray | None = None, hidden: np.ndarray | None = None,
+    glyphs: np.ndarray | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes a sequence of cells into one byte stream.
+
+    - `fg` and `bg`: (n, 3) uint8 arrays of rgb colors. With the default glyph (`▀`), that's the top and bottom pixel.
+    - `emit_fg` and `emit_bg`: (n,) bool arrays, True where the fg/bg color has to be (re-)emitted before the glyph.
+    - `color_mode`: how colors get written (see `_color_fields`).
+    - `repeats`: optional (n,) int array. Where > 0, the cell's glyph gets repeated that many times with REP (`\033[<n>b`).
+    - `hidden`: optional (n,) bool array of cells that produce no output, since a REP before them already covers them.
+    - `glyphs`: optional (n,) array of glyph ids (see `GLYPHS`). Default is `▀` for every cell.
+
+    Only the colors that changed get emitted. If both changed, they share a single SGR sequence
+    (`\033[38;2;r;g;b;48;2;r;g;bm`), which is 3 bytes shorter than two separate ones.
+
+    Returns (data, offsets): `data` is a 1D uint8 array of the encoded bytes, and `offsets[i]` is the
+    index in `data` where cell i ends (exclusive), so cell i is `data[offsets[i-1]:offsets[i]]`.
+    """
+
+    n = len(emit_fg)
+    fg_col = emit_fg[:, np.newaxis]
+    bg_col = emit_bg[:, np.newaxis]
+    any_col = fg_col | bg_col
+
+    fields = []
+    masks = []
+
+    def add_literal(s: bytes, when: np.ndarray | bool):
+        fields.append(_literal(s, n))
+        masks.append(np.broadcast_to(when, (n, len(s))))
+
+    def add_color(color: np.ndarray, is_fg: bool, when: np.ndarray):
+        prefix, values = _color_fields(color, is_fg, color_mode)
+        if len(prefix) > 0:
+            add_literal(prefix, when)
+        for c in range(values.shape[1]):
+            if c > 0:
+                add_literal(b';', when)
+            fields.append(_DEC_DIGITS[values[:, c]])
+            masks.append(_DEC_MASK[values[:, c]] & when)
+
+    add_literal(b'\033[', any_col)
+    add_color(fg, True, fg_col)
+    add_literal(b';', fg_col & bg_col) # separator, only when both are in the same sequence
+    add_color(bg, False, bg_col)
+    add_literal(b'm', any_col)
+    if glyphs is None:
+        add_literal(HALF_BLOCK, True)
+    else:
+        for glyph_id, glyph in enumerate(GLYPHS):
+            add_literal(glyph, (glyphs == glyph_id)[:, np.newaxis])
+    
+    if repeats is not None:
+        rep_col = (repeats > 0)[:, np.newaxis]
+        add_literal(b'\033[', rep_col)
+        digits, digit_mask = _dec_fields(repeats)
+        fields.append(digits)
+        masks.append(digit_mask & rep_col)
+        add_literal(b'b', rep_col)
+
+    template = np.concatenate(fields, axis=1)
+    mask = np.concatenate(masks, axis=1)
+    if hidden is not None:
+        mask &= ~hidden[:, np.newaxis]
+
+    # row-major boolean indexing keeps the cells (and the bytes inside each cell) in order
+    return template[mask], np.cumsum(mask.sum(axis=1))
+
+def encode_spans(
+    pixels: np.ndarray, 
+    rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, 
+    fg: Tuple[int, int, int] | None = None, bg: Tuple[int, int, int] | None = None,
+    color_mode: ColorMode = "truecolor",
+    rep_threshold: int | None = None,
+    pick_glyphs: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, Tuple[Tuple[int, int, int] | None, Tuple[int, int, int] | None]]:
+    """
+    Encodes many spans of a frame at once. `pixels` is a (h, w, 3) frame; span k covers the cells
+    `starts[k]` -> `ends[k]` (inclusive) of character row `rows[k]`.
+
+    The spans are expected to be printed back to back (with only cursor moves in between), so the terminal's
+    current fg and bg are tracked separately across the whole sequence: a cell only re-emits the fg or bg
+    if it needs a different one than what the cells before it left active.
+    
+    With `pick_glyphs`, every cell also gets the glyph that needs the fewest color changes (see `_pick_glyphs`).
+    Otherwise every cell is a `▀` with the top pixel as fg and the bottom pixel as bg.
+
+    `fg` and `bg` are the colors that are already active in the terminal before the first span (see `TermState`).
+    If None (unknown), the very first cell emits them.
+    
+    `color_mode`: see `encode_cells`.
+    
+    `rep_threshold`: if not None, runs of identical cells inside a span get printed as one cell + REP, when the run repeats
+    the cell at least that many times (and REP is actually shorter). None means off (the terminal doesn't support REP).
+
+    Returns (data, span_offsets, (fg, bg)): the encoded bytes of every span back to back,
+    `span_offsets` (len = num spans + 1) so that span k is `data[span_offsets[k]:span_offsets[k+1]]`,
+    and the fg and bg the terminal is left with (None if unknown).
+    """
+
+    lengths = ends - starts + 1
+    span_firsts = np.zeros(len(lengths)+1, dtype=np.int64)
+    np.cumsum(lengths, out=span_firsts[1:])
+
+    # column index of every cell: starts[k] + 0, 1, 2, ... for each span k
+    cols = np.arange(span_firsts[-1]) - np.repeat(span_firsts[:-1] - starts, lengths)
+    top_rows = np.repeat(rows*2, lengths)
+
+    top = pixels[top_rows, cols]
+    bottom = pixels[top_rows+1, cols]
+
+    if len(cols) == 0:
+        return np.zeros(0, dtype=np.uint8), np.zeros(len(lengths)+1, dtype=np.int64), (fg, bg)
+
+    # colors active before the first cell, -1 if unknown (never equal to a real color)
+    fg_start = np.array(fg if fg is not None else (-1, -1, -1), dtype=np.int16)
+    bg_start = np.array(bg if bg is not None else (-1, -1, -1), dtype=np.int16)
+
+    glyphs, fg_colors, bg_colors, emit_fg, emit_bg, repeats, hidden, fg_end, bg_end = _plan_sequence(
+        top, bottom, span_firsts, fg_start, bg_start, rep_threshold, pick_glyphs
+    )
+    data, offsets = encode_cells(fg_colors, bg_colors, emit_fg, emit_bg, color_mode, repeats, hidden, glyphs)
+
+    span_offsets = np.zeros(len(lengths)+1, dtype=np.int64)
+    span_offsets[1:] = offsets[span_firsts[1:]-1]
+
+    def to_color(c: np.ndarray) -> Tuple[int, int, int] | None:
+        return None if c[0] < 0 else tuple(int(v) for v in c)
+    return data, span_offsets, (to_color(fg_end), to_color(bg_end))
+
+def _plan_sequence(
+    top: np.ndarray, bottom: np.ndarray, span_firsts: np.ndarray, fg_start: np.ndarray, bg_start: np.ndarray,
+    rep_threshold: int | None, pick_glyphs: bool
+    ):
+    """ The part of `encode_spans` between gathering the cells and encoding them: `top`/`bottom` are the (n, 3) pixels of
+    every cell, `span_firsts` the index of the first cell of every span (+ n at the end), `fg_start`/`bg_start` the active
+    colors (-1 if unknown).
+    Returns (glyphs, fg colors, bg colors, emit_fg, emit_bg, repeats, hidden, fg at the end, bg at the end), see `encode_cells`.
+    `glyphs` is None without `pick_glyphs`, `repeats`/`hidden` without `rep_threshold`. """
+
+    if pick_glyphs:
+        glyphs, fg_colors, bg_colors, emit_fg, emit_bg, fg_end, bg_end = _pick_glyphs(top, bottom, fg_start, bg_start)
+        glyph_lens = _GLYPH_LENS[glyphs]
+    else:
+        glyphs, fg_colors, bg_colors = None, top, bottom
+        emit_fg = np.any(top != np.concatenate((fg_start[np.newaxis], top[:-1])), axis=1)
+        emit_bg = np.any(bottom != np.concatenate((bg_start[np.newaxis], bottom[:-1])), axis=1)
+        fg_end, bg_end = top[-1], bottom[-1]
+        glyph_lens = np.full(len(top), len(HALF_BLOCK))
+
+    repeats = hidden = None
+    if rep_threshold is not None:
+        # same glyph + colors as the cell before it, in the same span (REP right after a cursor move isn't worth the risk)
+        same = ~(emit_fg | emit_bg)
+        if glyphs is not None:
+            same[1:] &= glyphs[1:] == glyphs[:-1]
+        same[span_firsts[:-1]] = False
+        repeats, hidden = _plan_repeats(same, glyph_lens, rep_threshold)
+
+    return glyphs, fg_colors, bg_colors, emit_fg, emit_bg, repeats, hidden, fg_end, bg_end
+
+def _pick_glyphs(top: np.ndarray, bottom: np.ndarray, fg: np.ndarray, bg: np.ndarray):
+    """
+    Picks a glyph for every cell of a sequence, so that as few fg/bg changes as possible have to be emitted.
+    `top`/`bottom`: (n, 3) pixel colors. `fg`/`bg`: colors active before the first cell (-1 if unknown).
+
+    - cells with two different colors are `▀` (fg on top) or `▄` (fg on the bottom). Only the orientation relative to the
+    previous two-colored cell matters for the colors that have to change between them, so that gets picked for every pair
+    on its own, and the actual orientations are the parity of the running count of flips (xor-cumsum).
+    - cells with one color are `█` if the active fg already is that color (no change at all), otherwise a space
+    with that color as bg. Those never touch the fg, so the active fg only depends on the two-colored cells.
+
+    Returns (glyphs, fg colors, bg colors, emit_fg, emit_bg, fg at the end, bg at the end), see `encode_cells`.
+    """
+
+    n = len(top)
+    top = top.astype(np.int16)
+    bottom = bottom.astype(np.int16)
+    idx = np.arange(n)
+
+    def neq(a, b):
+        return np.any(a != b, axis=-1)
+
+    uniform = ~neq(top, bottom)
+
+    # orientation of the two-colored cells (flipped = ▄). the first one is compared with the colors that are already active
+    two_colored = np.flatnonzero(~uniform)
+    flipped = np.zeros(n, dtype=bool)
+    if len(two_colored) > 0:
+        t, b = top[two_colored], bottom[two_colored]
+        prev_t = np.concatenate((fg[np.newaxis], t[:-1]))
+        prev_b = np.concatenate((bg[np.newaxis], b[:-1]))
+        keep_cost = neq(t, prev_t).astype(np.int8) + neq(b, prev_b)
+        flip_cost = neq(t, prev_b).astype(np.int8) + neq(b, prev_t)
+        flipped[two_colored] = np.cumsum(flip_cost < keep_cost) % 2 == 1
+
+    fg_colors = np.where(flipped[:, np.newaxis], bottom, top)
+    bg_colors = np.where(flipped[:, np.newaxis], top, bottom)
+
+    # only two-colored cells set the fg: active fg = the one of the last two-colored cell so far (or the starting one)
+    last_fg_set = np.maximum.accumulate(np.where(~uniform, idx, -1))
+    fg_after = np.concatenate((fg[np.newaxis], fg_colors))[last_fg_set+1]
+    fg_before = np.concatenate((fg[np.newaxis], fg_after[:-1]))
+
+    use_full = uniform & ~neq(fg_before, top)
+    sets_bg = ~use_full # two-colored cells and spaces
+
+    last_bg_set = np.maximum.accumulate(np.where(sets_bg, idx, -1))
+    bg_after = np.concatenate((bg[np.newaxis], bg_colors))[last_bg_set+1]
+    bg_before = np.concatenate((bg[np.newaxis], bg_after[:-1]))
+
+    emit_fg = ~uniform & neq(fg_before, fg_colors)
+    emit_bg = sets_bg & neq(bg_before, bg_colors)
+
+    glyphs = np.where(uniform, np.where(use_full, FULL, SPACE), np.where(flipped, LOWER, UPPER))
+    return (
+        glyphs, fg_colors.astype(np.uint8), bg_colors.astype(np.uint8), emit_fg, emit_bg, 
+        fg_after[-1], bg_after[-1]
+    )
+
+def count_sgr(data: np.ndarray) -> int:
+    """ Number of SGR (color) sequences in bytes from `encode_cells`. Every one of them ends with an `m`,
+    and nothing else in there has that byte (glyphs are all ascii space or >= 0x80). """
+    return int(np.count_nonzero(data == ord('m')))
+
+def _plan_repeats(same: np.ndarray, glyph_lens: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Picks the runs of identical cells to print with REP. `same[i]` is True if cell i can be printed as a repeat of cell i-1,
+    and `glyph_lens[i]` is the length of cell i's glyph in bytes.
+    A run of 1 + k cells gets REP'd if k >= `threshold` and `\033[<k>b` is shorter than k glyphs.
+    Returns (repeats, hidden) for `encode_cells`. """
+    
+    run_firsts = np.flatnonzero(~same)
+    run_ids = np.cumsum(~same) - 1
+    extra = np.diff(np.append(run_firsts, len(same))) - 1 # cells after the first one, per run
+    
+    use = (extra >= threshold) & (extra*glyph_lens[run_firsts] > 3 + _num_digits(np.maximum(extra, 1)))
+    
+    repeats = np.zeros(len(same), dtype=np.int64)
+    repeats[run_firsts[use]] = extra[use]
+    hidden = same & use[run_ids]
+    return repeats, hidden
+
+_DEC_LENS = _DEC_MASK.sum(axis=1)
+""" Number of decimal digits of every value 0-255. """
+
+def _num_digits(n: np.ndarray) -> np.ndarray:
+    """ Number of decimal digits of every (positive) int in n. """
+    return 1 + (n >= 10) + (n >= 100) + (n >= 1000) + (n >= 10000)
+
+def _color_len(colors: np.ndarray, is_fg: bool, color_mode: ColorMode) -> np.ndarray:
+    """ Number of bytes a color takes in an SGR sequence, e.g. `38;2;r;g;b`. """
+    prefix, values = _color_fields(colors, is_fg, color_mode)
+    return len(prefix) + _DEC_LENS[values].sum(axis=-1) + values.shape[-1]-1
+
+def _sgr_len(emit_fg: np.ndarray, emit_bg: np.ndarray, fg: np.ndarray, bg: np.ndarray, color_mode: ColorMode = "truecolor") -> np.ndarray:
+    """ Number of bytes `encode_cells` spends on color codes for cells with these fg/bg colors and emit flags (glyph not included). """
+    fg_len = _color_len(fg, True, color_mode)
+    bg_len = _color_len(bg, False, color_mode)
+    return 3*(emit_fg | emit_bg) + fg_len*emit_fg + bg_len*emit_bg + (emit_fg & emit_bg) # \033[ ... m, and ; between
+
+def _cell_len(
+    top: np.ndarray, bottom: np.ndarray, fg: np.ndarray, bg: np.ndarray, 
+    color_mode: ColorMode = "truecolor", pick_glyphs: bool = True
+    ) -> np.ndarray:
+    """ Number of bytes `encode_spans` spends on a cell (colors + glyph) when `fg`/`bg` are active before it (-1 if unknown).
+    All (n, 3). Same choices as `_pick_glyphs`, except a two-colored cell always gets whichever orientation is shorter. """
+
+    def neq(a, b):
+        return np.any(a.astype(np.int16) != b.astype(np.int16), axis=-1)
+
+    keep = _sgr_len(neq(fg, top), neq(bg, bottom), top, bottom, color_mode) + len(HALF_BLOCK)
+    if not pick_glyphs:
+        return keep
+
+    flip = _sgr_len(neq(fg, bottom), neq(bg, top), bottom, top, color_mode) + len(GLYPHS[LOWER])
+    uniform = ~neq(top, bottom)
+    space = _sgr_len(np.zeros(len(top), dtype=bool), neq(bg, top), top, top, color_mode) + len(GLYPHS[SPACE])
+    single = np.where(neq(fg, top), space, len(GLYPHS[FULL]))
+    return np.where(uniform, single, np.minimum(keep, flip))
+
+def bridge_gaps(
+    pixels: np.ndarray, rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, 
+    color_mode: ColorMode = "truecolor", rep_threshold: int | None = None, pick_glyphs: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Span planner for intervaled rendering. Takes the intervals of changed cells (rows, starts, ends, end exclusive,
+    ordered by row then start, see `get_frame_diff_intervals`) and decides, for every unchanged gap between two intervals
+    on the same row, whether it's cheaper to jump over it with a cursor move or to just repaint the gap.
+
+    - repaint: every cell in the gap + the first cell of the next interval, as `encode_spans` would print them when
+    repainting the row from its first change to its last one (so with the same glyphs, color changes and REPs)
+    - jump: CUF over the gap + the first cell of the next interval, printed with the colors the cell before the gap
+    left active
+
+    Without glyph picking and REP, everything after the first cell of the next interval costs the same either way, so that's
+    exact. With them, the cells after it can come out a bit differently (other glyph orientations, REP runs cut at the jump),
+    so it's an estimate - `CameraFrame.render_intervaled` also checks the first change -> last change plan, and prints that
+    if it's shorter, so it never prints more than `render`.
+
+    `color_mode`, `rep_threshold`, `pick_glyphs`: the ones the spans are going to be encoded with (see `encode_spans`).
+
+    Returns the merged intervals as (rows, starts, ends), end exclusive.
+    """
+
+    if len(rows) < 2:
+        return rows, starts, ends
+
+    # every dirty row from its first change to its last one, encoded in one sequence like the spans would be
+    dirty_rows, row_idx = np.unique(rows, return_inverse=True)
+    row_firsts = np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1])))
+    first = starts[row_firsts]
+    last = np.maximum.reduceat(ends, row_firsts)
+
+    lengths = last - first
+    span_firsts = np.zeros(len(lengths)+1, dtype=np.int64)
+    np.cumsum(lengths, out=span_firsts[1:])
+    cols = np.arange(span_firsts[-1]) - np.repeat(span_firsts[:-1] - first, lengths)
+    top_rows = np.repeat(dirty_rows*2, lengths)
+    top = pixels[top_rows, cols]
+    bottom = pixels[top_rows+1, cols]
+
+    unknown = np.full(3, -1, dtype=np.int16)
+    glyphs, fg_colors, bg_colors, emit_fg, emit_bg, repeats, hidden, _, _ = _plan_sequence(
+        top, bottom, span_firsts, unknown, unknown, rep_threshold, pick_glyphs
+    )
+    # bytes of every cell, same as `encode_cells` would make (without building them)
+    cell_lens = _sgr_len(emit_fg, emit_bg, fg_colors, bg_colors, color_mode)
+    cell_lens += _GLYPH_LENS[glyphs] if glyphs is not None else len(HALF_BLOCK)
+    if repeats is not None:
+        cell_lens += (repeats > 0) * (3 + _num_digits(np.maximum(repeats, 1)))
+        cell_lens[hidden] = 0
+    cell_ends = np.zeros(len(cell_lens)+1, dtype=np.int64) # cell i is bytes cell_ends[i] -> cell_ends[i+1]
+    np.cumsum(cell_lens, out=cell_ends[1:])
+
+    # colors active after every cell: two-colored cells set the fg, everything but `█` sets the bg
+    if glyphs is not None:
+        idx = np.arange(len(glyphs))
+        sets_fg = (glyphs == UPPER) | (glyphs == LOWER)
+        active_fg = np.concatenate((unknown[np.newaxis], fg_colors.astype(np.int16)))[
+            np.maximum.accumulate(np.where(sets_fg, idx, -1)) + 1
+        ]
+        active_bg = np.concatenate((unknown[np.newaxis], bg_colors.astype(np.int16)))[
+            np.maximum.accumulate(np.where(glyphs != FULL, idx, -1)) + 1
+        ]
+    else:
+        active_fg, active_bg = top, bottom
+
+    # gap k sits between interval k-1 (ending at b, exclusive) and interval k (starting at c), on the same row
+    same_row = rows[1:] == rows[:-1]
+    gaps = np.flatnonzero(same_row)
+    r = row_idx[1:][gaps]
+    b = ends[:-1][gaps]
+    c = starts[1:][gaps]
+    cell_b = span_firsts[r] + b - first[r] # sequence index of the first gap cell
+    cell_c = span_firsts[r] + c - first[r]
+
+    repaint = cell_ends[cell_c+1] - cell_ends[cell_b]
+
+    gap_len = c - b
+    cuf_len = 3 + (gap_len > 1)*_num_digits(gap_len)
+    jump = cuf_len + _cell_len(top[cell_c], bottom[cell_c], active_fg[cell_b-1], active_bg[cell_b-1], color_mode, pick_glyphs)
+
+    bridged = np.zeros(len(rows)-1, dtype=bool)
+    bridged[gaps] = repaint <= jump
+    """ bridged[k-1] is True if interval k gets merged into the interval before it """
+
+    keep_start = np.ones(len(rows), dtype=bool)
+    keep_start[1:] = ~bridged
+    keep_end = np.ones(len(rows), dtype=bool)
+    keep_end[:-1] = ~bridged
+
+    return rows[keep_start], starts[keep_start], ends[keep_end]
@@ -0,0 +1,89 @@
+from typing import TYPE_CHECKING, Tuple
+from time import perf_counter
+from camera_frame import CameraFrame, RGBTuple
+from gd_constants import stuff
+if TYPE_CHECKING:
+    from band_encoder import BandEncoder
+    from quality import QualityController
+
+class FramePresenter:
+    """
+    Double buffer of CameraFrames for playback/game loops.
+
+    Draw the next frame into `back`, then call `present()`: it renders `back` against `front` (the frame that's
+    currently on screen) and swaps the two. The two frames get reused forever, so steady-state playback doesn't allocate
+    a new frame (or re-read the terminal size) every tick - just call `clear()` before drawing the next one.
+    
+    ```python
+    presenter = FramePresenter()
+    for image in images:
+        presenter.clear()
+        presenter.back.add_pixels_topleft(0, 0, image)
+        presenter.present()
+    ```
+    """
+
+    def __init__(
+        self,
+        size: Tuple[int | None, int | None] = (None, None),
+        pos: Tuple[int | None, int | None] = (0, 0),
+        band_encoder: "BandEncoder | None" = None,
+        quality: "QualityController | None" = None,
+        tolerance: int = 0
+    ) -> None:
+        """ Same params as `CameraFrame`. The terminal size is only read once, here.
+        
+        Optional:
+        - `band_encoder`: if given, frames get diffed + encoded on its process pool (see `CameraFrame.render_parallel`).
+        - `quality`: if given, every frame gets its quality adjusted to what the terminal keeps up with (see `QualityController`).
+        - `tolerance`: diff tolerance for every frame (see `CameraFrame.render`), e.g. to ignore compression noise in videos.
+        With a `quality` controller, the bigger of this and the controller's tolerance is used. """
+        
+        width = size[0] if size[0] is not None else stuff.term.width
+        height = size[1] if size[1] is not None else stuff.term.height*2
+        
+        self.front = CameraFrame((width, height), pos)
+        """ The frame that's currently on the screen (what the next frame gets diffed against). """
+        self.back = CameraFrame((width, height), pos)
+        """ The frame being drawn. """
+        
+        self.band_encoder = band_encoder
+        self.quality = quality
+        self.tolerance = tolerance
+        
+        self.presented_any = False
+        """ False until the first `present()`. The first frame has nothing to diff against, so it gets fully printed. """
+
+    def clear(self, color: RGBTuple = (0, 0, 0)) -> CameraFrame:
+        """ Clears the back frame in place (see `CameraFrame.clear`) and returns it, ready to draw on. """
+        self.back.clear(color)
+        return self.back
+
+    def present(self) -> None:
+        """ Prints the back frame (only the changes from the front frame, except for the very first one), then swaps them. """
+        
+        if self.quality is not None:
+            self.quality.apply(self.back)
+        tolerance = self.tolerance
+        if self.quality is not None:
+            tolerance = max(tolerance, self.quality.current.tolerance)
+        
+        time_start = perf_counter()
+        if self.presented_any and self.band_encoder is not None:
+            self.back.render_parallel(self.front, self.band_encoder, tolerance)
+        elif self.presented_any:
+            self.back.render(self.front, tolerance)
+        else:
+            self.back.render_raw()
+            self.presented_any = True
+            time_start = None # printed through print3, not a normal frame
+        
+        if self.quality is not None and time_start is not None:
+            self.quality.record(stuff.term_state.last_frame_bytes, perf_counter() - time_start)
+        
+        self.front, self.back = self.back, self.front
+
+    def reset(self) -> None:
+        """ Forget what's on the screen (e.g. after something else printed over it), so the next `present()` prints the whole frame. """
+        self.presented_any = False
+        stuff.term_state.invalidate()
@@ -0,0 +1,92 @@
+from time import perf_counter, sleep
+from typing import Iterator
+
+class FrameScheduler:
+    """
+    Paces playback at a fixed fps against a monotonic clock (`perf_counter`).
+
+    Frame i is due at `start + i/fps`, no matter how long the frames before it took, so slow frames don't
+    make the playback drift behind. If we fall a whole frame period (or more) behind, the frames we missed
+    are skipped entirely - not composed, not rendered - and playback picks up with the frame that should be
+    on screen right now.
+
+    Skipped frames never touch the screen, so with a `FramePresenter` the next frame still gets diffed
+    against the last frame that was actually presented (its `front`).
+
+    ```python
+    scheduler = FrameScheduler(30)
+    for i in scheduler.frames(len(video)):
+        presenter.clear().add_pixels_topleft(0, 0, video[i])
+        presenter.present()
+    Logger.log(scheduler.report())
+    ```
+    """
+
+    def __init__(self, fps: float, late_tolerance: float = 0.002) -> None:
+        """ - `fps`: target frame rate.
+        - `late_tolerance`: seconds a frame can come after its deadline without counting as late. """
+        self.fps = fps
+        self.period = 1 / fps
+        """ Seconds between two frames. """
+        self.late_tolerance = late_tolerance
+
+        self.start_time: float | None = None
+        """ `perf_counter()` time playback started (the first frame was due). None until playback starts. """
+        self.end_time: float | None = None
+        """ `perf_counter()` time the last frame was done. """
+
+        self.presented = 0
+        """ Frames handed out to be composed + presented. """
+        self.dropped = 0
+        """ Frames skipped because we were a whole period (or more) behind. """
+        self.late = 0
+        """ Frames handed out more than `late_tolerance` after their deadline (including the ones right after a drop). """
+        self.max_lateness = 0.0
+        """ Worst lateness of a frame, in seconds. """
+
+    def frames(self, n_frames: int, first: int = 0) -> Iterator[int]:
+        """ Yields the indices of the frames to compose + present, from `first` to `n_frames` (exclusive),
+        each one at (or as soon as possible after) its deadline. Indices of dropped frames are skipped. """
+
+        self.start_time = perf_counter()
+        self.end_time = None
+        zero_time = self.start_time - first*self.period # when frame 0 would have been due
+        i = first
+        while i < n_frames:
+            now = perf_counter()
+
+            # the frame that should be on screen right now. anything before that is too late to bother with
+            due = int((now - zero_time) / self.period)
+            if due > i:
+                self.dropped += min(due, n_frames) - i
+                i = due
+                if i >= n_frames:
+                    break
+
+            deadline = zero_time + i*self.period
+            if now < deadline:
+                sleep(deadline - now)
+            elif now - deadline > self.late_tolerance:
+                self.late += 1
+                self.max_lateness = max(self.max_lateness, now - deadline)
+
+            self.presented += 1
+            yield i
+            i += 1
+
+        self.end_time = perf_counter()
+
+    @property
+    def achieved_fps(self) -> float:
+        """ Frames presented per second of playback so far. """
+        if self.start_time is None:
+            return 0.0
+        elapsed = (self.end_time if self.end_time is not None else perf_counter()) - self.start_time
+        return self.presented / elapsed if elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        """ One line summary of how playback went. """
+        return (
+            f"[FrameScheduler] target {self.fps:.2f} fps, achieved {self.achieved_fps:.2f} fps. "
+            f"{self.presented} frames presented, {self.late} late (worst by {self.max_lateness*1000:.1f}ms), {self.dropped} dropped"
+        )
@@ -0,0 +1,109 @@
+"""
+On-disk store of decoded, resized video frames, so playback doesn't have to decode anything.
+
+Convert a video once:
+
+    python frame_store.py badapple72p.mp4 badapple.frames --size 160 90 --grayscale
+
+then play it with `FrameStore("badapple.frames")[i]`. The frames get memory-mapped (`np.memmap`), so opening the
+store is instant, only the frames actually shown ever get read, and several players on one machine share the same
+page cache instead of each holding their own copy.
+
+File layout (little endian):
+- header (`_HEADER`): magic, version, fps, width, height, number of frames, number of stored frames, offset of the index
+- stored frames from byte `_DATA_OFFSET` on: raw (height, width, 3) uint8 arrays back to back. A run of identical
+consecutive frames is only stored once.
+- index: one uint32 per frame, which stored frame it is
+"""
+
+import argparse
+import struct
+from typing import Iterable
+import numpy as np
+
+_MAGIC = b'CHFRAMES'
+_VERSION = 1
+_HEADER = struct.Struct('<8sIdIIIIQ')
+_DATA_OFFSET = 4096
+""" Frames start at the first page boundary, so every frame's data is aligned the same way. """
+
+class FrameStore:
+    """ Read-only view of a frame store file. `store[i]` is frame i as a (height, width, 3) uint8 array (backed by
+    the file, so don't write to it). """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        magic, version, fps, width, height, n_frames, n_stored, index_offset = _HEADER.unpack(header)
+        assert magic == _MAGIC, f"[FrameStore]: {path} isn't a frame store"
+        assert version == _VERSION, f"[FrameStore]: {path} has version {version}, expected {_VERSION}"
+
+        self.path = path
+        self.fps: float = fps
+        self.width: int = width
+        self.height: int = height
+        self.stored = n_stored
+        """ Number of frames actually stored (after deduplication). """
+
+        if n_frames == 0: # np.memmap can't map 0 bytes
+            self.frames = np.zeros((0, height, width, 3), dtype=np.uint8)
+            self.index = np.zeros(0, dtype="<u4")
+            return
+        
+        self.frames = np.memmap(path, dtype=np.uint8, mode="r", offset=_DATA_OFFSET, shape=(n_stored, height, width, 3))
+        """ The stored frames. """
+        self.index = np.memmap(path, dtype="<u4", mode="r", offset=index_offset, shape=(n_frames,))
+        """ For every frame, which stored frame it is. """
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.frames[self.index[i]]
+
+    def is_repeat(self, i: int) -> bool:
+        """ True if frame i is the same as frame i-1 (so there's nothing to redraw). """
+        return i > 0 and self.index[i] == self.index[i-1]
+
+def write_store(path: str, frames: Iterable[np.ndarray], fps: float) -> FrameStore:
+    """ Writes frames (all the same shape) to a new store at `path`, one at a time, so the video never has to fit
+    in memory. Returns the store, opened. """
+    index = []
+    last = None
+    n_stored = 0
+    with open(path, "wb") as f:
+        f.write(b'\0' * _DATA_OFFSET) # header goes here once the counts are known
+        for frame in frames:
+            if last is None or not np.array_equal(frame, last):
+                last = np.ascontiguousarray(frame, dtype=np.uint8).copy() # frames can be reused buffers
+                f.write(last.tobytes())
+                n_stored += 1
+            index.append(n_stored-1)
+
+        index_offset = f.tell()
+        f.write(np.array(index, dtype="<u4").tobytes())
+
+        height, width = last.shape[:2] if last is not None else (0, 0)
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, _VERSION, fps, width, height, len(index), n_stored, index_offset))
+
+    return FrameStore(path)
+
+def main() -> None:
+    from vid_to_np import iter_frames
+
+    parser = argparse.ArgumentParser(description="Decodes a video once into a frame store (see frame_store.py).")
+    parser.add_argument("video")
+    parser.add_argument("output")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--size", type=int, nargs=2, default=(None, None), metavar=("W", "H"),
+        help="box in pixels to fit the frames in (e.g. terminal width, 2*terminal height)")
+    parser.add_argument("--grayscale", action="store_true")
+    args = parser.parse_args()
+
+    width, height = args.size
+    store = write_store(args.output, iter_frames(args.video, args.fps, width, height, args.grayscale), args.fps)
+    print(f"{len(store)} frames ({store.stored} stored) of {store.width}x{store.height} at {store.fps:g} fps -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import sys
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+from output_buffer import OutputBuffer, write_all
+
+class FrameWriter:
+    """
+    Writes encoded frames to the terminal on a background thread, so the main loop can compose and encode
+    frame N+1 while the terminal is still taking in frame N.
+
+    Frames are handed over as `OutputBuffer`s through a bounded queue. The buffers get recycled (a small pool
+    is allocated up front), so nothing gets copied or allocated per frame. When the queue is full, `submit`
+    blocks - that's the backpressure telling the main loop the terminal can't keep up.
+
+    Plug it in with `stuff.term_state.writer = FrameWriter()`, and `close()` it when done.
+
+    If a write fails (e.g. the terminal went away: EPIPE/EIO), the thread keeps taking frames off the queue (and drops them),
+    so nothing ends up waiting on it forever, and the error gets raised (once) from the next `submit`, `drain` or `close`.
+
+    Timing stats (all in seconds, totals since creation):
+    - `write_time`: time the writer thread spent blocked in `os.write` (the terminal draining output)
+    - `idle_time`: time the writer thread spent waiting for the next frame (the encoder being slow)
+    - `submit_wait_time`: time the main thread spent in `submit` waiting for a free buffer (queue full)
+    """
+
+    def __init__(self, fd: int | None = None, max_queued: int = 2, buffer_capacity: int = 1 << 20) -> None:
+        """
+        - `fd`: file descriptor to write to. Defaults to stdout.
+        - `max_queued`: how many frames can be waiting to be written before `submit` blocks.
+        - `buffer_capacity`: initial size of each pooled buffer, in bytes.
+        """
+        self.fd = fd if fd is not None else sys.stdout.fileno()
+
+        self.queue: Queue[OutputBuffer | None] = Queue(maxsize=max_queued)
+        """ Filled buffers waiting to be written. None tells the thread to stop. """
+        self.free: Queue[OutputBuffer] = Queue()
+        """ Buffers that have been written and can be filled again. """
+        # one buffer for every queue slot, plus the one being written
+        for _ in range(max_queued+1):
+            self.free.put(OutputBuffer(buffer_capacity))
+
+        self.write_time = 0.0
+        self.idle_time = 0.0
+        self.submit_wait_time = 0.0
+        self.frames_written = 0
+        self.bytes_written = 0
+
+        self.error: OSError | None = None
+        """ What the last failed write raised. Once set, frames get dropped instead of written. """
+        self._error_raised = False
+
+        self.thread = Thread(target=self._run, daemon=True, name="FrameWriter")
+        self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time_start = perf_counter()
+            buffer = self.queue.get()
+            self.idle_time += perf_counter() - time_start
+
+            if buffer is None:
+                self.queue.task_done()
+                return
+
+            if self.error is None:
+                time_start = perf_counter()
+                try:
+                    write_all(self.fd, buffer.getvalue())
+                except OSError as e:
+                    self.error = e
+                else:
+                    self.frames_written += 1
+                    self.bytes_written += buffer.length
+                self.write_time += perf_counter() - time_start
+
+            buffer.clear()
+            self.free.put(buffer)
+            self.queue.task_done()
+
+    def _raise_error(self) -> None:
+        """ Raises the writer thread's error, the first time this gets called after it happened. """
+        if self.error is not None and not self._error_raised:
+            self._error_raised = True
+            raise self.error
+
+    def submit(self, buffer: OutputBuffer) -> OutputBuffer:
+        """ Queues a filled buffer to be written, and returns an empty one to build the next frame in.
+        Blocks if `max_queued` frames are already waiting. """
+        self._raise_error()
+        sys.stdout.flush() # anything print()ed before should go out before this frame
+
+        time_start = perf_counter()
+        next_buffer = self.free.get()
+        self.queue.put(buffer)
+        self.submit_wait_time += perf_counter() - time_start
+        return next_buffer
+
+    def drain(self) -> None:
+        """ Blocks until every queued frame has been written. """
+        self.queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """ Writes out whatever is still queued, then stops the thread. """
+        self.queue.put(None)
+        self.thread.join()
+        self._raise_error()
@@ -2,12 +2,16 @@ from blessed import Terminal
 from typing import List, Tuple, Dict
 from enum import Enum
 import curses
+from term_state import TermState
 
 class stuff:
     """ General constants for the game and stuff """
     
     term = Terminal()
     
+    term_state = TermState(term)
+    """ What the renderer thinks the terminal currently looks like (cursor pos, active colors). Kept across frames. """
+    
     #screen = curses.initscr()
     #curses.start_color()
     
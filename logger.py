@@ -1,18 +1,109 @@
 from time import time
+from collections import deque
+from threading import Event, Thread
+from typing import Deque, List, TextIO, Tuple
 import os
 
+LogEntry = Tuple[object, tuple]
+""" (message, args). Formatted as `message % args` only when it gets written out. """
+
 class Logger:
+    """
+    Collects log messages in memory and writes them to a file (`write()` at exit, or continuously with `start_background`).
+
+    Messages are formatted lazily: `Logger.debug("blended %s with %s", a, b)` only stores the message and its args,
+    and `%` formatting happens when the entry gets written out - if it gets through the level check at all.
+    So use args instead of f-strings in hot paths. (Args are formatted later, so mutable ones like arrays
+    show up how they look at write time.)
+    """
+
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
 
-    buffer = []
+    level = INFO
+    """ Messages below this level are dropped before anything gets formatted or stored. """
+
+    buffer: List[LogEntry] | Deque[LogEntry] = []
+    """ Entries not written out yet. A list, or a fixed-size ring (deque) in background mode. """
     _count = 0
+    dropped = 0
+    """ Entries that fell out of the ring before the background thread got to write them. """
+
+    _flusher: Thread | None = None
+    _stop_flusher = Event()
+    _file: TextIO | None = None
+    _path = "latest.log"
 
     onscreen_history = []
     max_onscreen_len = 5
 
-    def log(msg: str):
-        Logger.buffer.append(str(msg))
+    def log(msg, *args, level: int = INFO):
+        if level < Logger.level:
+            return
+        buffer = Logger.buffer
+        if buffer.__class__ is deque and len(buffer) == buffer.maxlen:
+            Logger.dropped += 1
+        buffer.append((msg, args))
         Logger._count += 1
 
+    @staticmethod
+    def debug(msg, *args) -> None:
+        """ `log` at DEBUG level. Off by default, so it costs a function call and a comparison. """
+        if Logger.level <= Logger.DEBUG:
+            Logger.log(msg, *args, level=Logger.DEBUG)
+
+    @staticmethod
+    def _format(entry: LogEntry) -> str:
+        msg, args = entry
+        if not args:
+            return str(msg)
+        try:
+            return str(msg) % args
+        except (TypeError, ValueError):
+            return f"{msg} {args}"
+
+    @staticmethod
+    def start_background(path: str = "latest.log", capacity: int = 8192, interval: float = 0.5) -> None:
+        """
+        Switches to a fixed-size ring of `capacity` entries that a background thread formats and appends to `path`
+        every `interval` seconds. Memory stays bounded on long runs; if more than `capacity` entries come in
+        between two flushes, the oldest ones are dropped (counted in `dropped`).
+        `write()` stops the thread and writes whatever is left.
+        """
+        if Logger._flusher is not None:
+            return
+
+        Logger.buffer = deque(Logger.buffer, maxlen=capacity)
+        Logger._path = path
+        Logger._file = open(path, "w", encoding='utf-8')
+        Logger._file.write(f">>> LOG TIMESTAMP {time()}\n\n")
+
+        Logger._stop_flusher.clear()
+        Logger._flusher = Thread(target=Logger._flush_loop, args=(interval,), daemon=True, name="LoggerFlush")
+        Logger._flusher.start()
+
+    @staticmethod
+    def _flush_loop(interval: float) -> None:
+        while not Logger._stop_flusher.wait(interval):
+            Logger._flush_pending()
+        Logger._flush_pending()
+
+    @staticmethod
+    def _flush_pending() -> None:
+        """ Formats + appends every entry in the ring to the file. popleft is atomic, so `log` never needs a lock. """
+        buffer = Logger.buffer
+        lines = []
+        while True:
+            try:
+                lines.append(Logger._format(buffer.popleft()))
+            except IndexError:
+                break
+        if lines:
+            Logger._file.write('\n'.join(lines) + '\n')
+            Logger._file.flush()
+
     @staticmethod
     def log_on_screen(term, msg: str):
         """
@@ -38,7 +129,7 @@ class Logger:
                 os.makedirs(fp+"/logs")
 
             with open(f"logs/{int(time())}.log", "w", encoding='utf-8') as log_f:
-                log_f.writelines('\n'.join(Logger.buffer))
+                log_f.writelines('\n'.join(map(Logger._format, Logger.buffer)))
                 log_f.close()
                 print(f"\x1b[0mLogged {Logger._count} messages to logs/{int(time())}.log.")
 
@@ -49,13 +140,24 @@ class Logger:
             print(f"\x1b[0mLogger buffer is empty, did not write to file.")
             
     def write(dont_clear_buffer: bool = False):
-        """ Writes logs to `latest.log`. Clears and rewrites every time so you dont have to dig through 10000 log files. """
+        """ Writes logs to `latest.log`. Clears and rewrites every time so you dont have to dig through 10000 log files.
+        In background mode, stops the background thread instead, after it wrote what's left. """
+
+        if Logger._flusher is not None:
+            Logger._stop_flusher.set()
+            Logger._flusher.join()
+            Logger._file.close()
+            Logger._flusher = Logger._file = None
+            Logger.buffer = []
+            dropped = f" ({Logger.dropped} dropped)" if Logger.dropped else ""
+            print(f"\x1b[0mLogged {Logger._count} messages to {Logger._path}{dropped}.")
+            return
 
         if len(Logger.buffer) > 0:
             with open(f"latest.log", "w", encoding='utf-8') as log_f:
                 # first, write curr timestamp
                 log_f.write(f">>> LOG TIMESTAMP {time()}\n\n")
-                log_f.writelines('\n'.join(Logger.buffer))
+                log_f.writelines('\n'.join(map(Logger._format, Logger.buffer)))
                 log_f.close()
                 print(f"\x1b[0mLogged {Logger._count} messages to latest.log.")
 
@@ -63,4 +165,4 @@ class Logger:
                     Logger.buffer.clear()
 
         else:
-            print(f"\x1b[0mLogger buffer is empty, did not write to file.")
\ No newline at end of file
+            print(f"\x1b[0mLogger buffer is empty, did not write to file.")
@@ -1,35 +1,91 @@
 import curses
 from logger import Logger
 import traceback
+import os
 from cursor import hide, show
 from gd_constants import stuff
-from time import sleep, time_ns
-from camera_frame import CameraFrame
-from vid_to_np import get_bad_apple
+from time import sleep
+from frame_presenter import FramePresenter
+from frame_scheduler import FrameScheduler
+from frame_writer import FrameWriter
+from quality import QualityController
+from render_metrics import RenderMetrics
+from vid_to_np import BAD_APPLE_PATH, BAD_APPLE_STORE, BAD_APPLE_DELTAS, count_frames, stream_bad_apple, frame_reader
+from frame_store import FrameStore
+from delta_stream import DeltaStream, play
 
 def main():
     
     FPS = 30
     
-    bad_apple = get_bad_apple()
+    # logs get written to latest.log as they come in, from a bounded ring, instead of all at once at exit
+    Logger.start_background()
+    
+    if os.path.exists(BAD_APPLE_DELTAS):
+        stream = DeltaStream(BAD_APPLE_DELTAS)
+        fits = stream.fits(stuff.term.width, stuff.term.height)
+        stream.close()
+        if fits:
+            # compiled ahead of time (see delta_stream.py): no rendering at all, just writing byte ranges out of the file
+            Logger.log(play(BAD_APPLE_DELTAS).report())
+            return
+        Logger.log(f"{BAD_APPLE_DELTAS} was compiled for a bigger terminal, rendering live instead")
+    
+    if os.path.exists(BAD_APPLE_STORE):
+        # converted ahead of time (see frame_store.py): frames come straight out of the page cache, nothing to decode
+        store = FrameStore(BAD_APPLE_STORE)
+        read_frame, n_frames = store.__getitem__, len(store)
+        FPS = store.fps
+    else:
+        # frames get decoded one at a time, right before they're drawn, instead of decoding the whole video up front.
+        # scaled to fit the terminal (2 pixels per row) as they get decoded
+        read_frame = frame_reader(stream_bad_apple(stuff.term.width, stuff.term.height*2))
+        n_frames = count_frames(BAD_APPLE_PATH, FPS)
     
     #stuff.screen.addstr(0, 0, f"bad apple video array shape: {bad_apple.shape}")
     sleep(2)
     
-    frame = CameraFrame()
-    frame.add_pixels_topleft(0, 0, bad_apple[0])
-    frame.render_raw()    
-    #curses.napms(500)
-    for i in range(1, len(bad_apple)):
-        
-        new_frame = CameraFrame()
-        new_frame.add_pixels_topleft(0, 0, bad_apple[i])
+    # terminal writes happen on a background thread, while the next frame gets composed + encoded
+    writer = FrameWriter()
+    stuff.term_state.writer = writer
+    # long runs of the same color (most of bad apple) get printed as one cell + REP, if the terminal has it
+    stuff.term_state.enable_rep()
+    # diff/encode/write time + output size of every frame, summarized (and dumped to metrics.csv) at the end
+    metrics = stuff.term_state.metrics = RenderMetrics()
+    # lowers colors/resolution when the terminal can't keep up (e.g. over ssh), and raises them back when it can
+    quality = QualityController(FPS, writer=writer)
+    # frame i is due at start + i/FPS. when rendering falls behind, frames get skipped instead of drifting
+    scheduler = FrameScheduler(FPS)
+    
+    try:
+        # two frames that get reused for the whole video (draw into the back one, present, swap).
+        # small tolerance so compression noise doesn't get repainted every frame
+        presenter = FramePresenter(quality=quality, tolerance=6)
+        presenter.clear().add_pixels_topleft(0, 0, read_frame(0))
+        presenter.present() # first frame gets fully printed (slow, so it happens before the clock starts)
+        #curses.napms(500)
         
-        time_start = time_ns()
-        new_frame.render(frame)
-        Logger.log(f"frame {i} took {(time_ns()-time_start)/1e9:4f}s to render.")
-        frame = new_frame
-        sleep(1/FPS)
+        for i in scheduler.frames(n_frames, first=1):
+            
+            frame = read_frame(i)
+            if frame is None:
+                break # the video had fewer frames than its metadata said
+            
+            presenter.clear().add_pixels_topleft(0, 0, frame)
+            presenter.present()
+    
+    finally:
+        # also when quitting with ctrl+c, which is how playback usually ends
+        writer.close()
+        stuff.term_state.writer = None
+        Logger.log(scheduler.report())
+        Logger.log(quality.report())
+        Logger.log(metrics.report())
+        metrics.dump("metrics.csv")
+        Logger.log(
+            f"writer: {writer.frames_written} frames, {writer.bytes_written} bytes. blocked on terminal {writer.write_time:4f}s, "
+            f"waiting for frames {writer.idle_time:4f}s, main thread waited {writer.submit_wait_time:4f}s for a free buffer"
+        )
     
 
 if __name__ == "__main__":
@@ -42,7 +98,7 @@ if __name__ == "__main__":
         print(f"\x1b[31m{traceback.format_exc()}\x1b[0m")
     except KeyboardInterrupt:
         Logger.log(f"qutting")
-        print(f"quit")
+        print(f"\x1b[0mquit") # frames dont reset colors at the end anymore
     
     show()
     #curses.endwin()  
@@ -0,0 +1,74 @@
+import os
+import sys
+import select
+import numpy as np
+
+def write_all(fd: int, data) -> None:
+    """ Writes all of `data` (bytes-like) to the file descriptor `fd`, handling partial writes
+    (which happen with pipes/ptys when the reader is slow) and non-blocking fds. """
+    view = memoryview(data)
+    while len(view) > 0:
+        try:
+            written = os.write(fd, view)
+        except BlockingIOError:
+            select.select([], [fd], []) # wait until the terminal can take more
+            continue
+        view = view[written:]
+
+class OutputBuffer:
+    """
+    Reusable byte buffer that a frame's output gets built in before being written to the terminal.
+
+    The memory is allocated once and reused every frame (only grows if a frame ever needs more),
+    so building a frame is just copying bytes in - no string concatenation, no utf-8 encoding.
+    """
+
+    def __init__(self, capacity: int = 1 << 20) -> None:
+        """ `capacity`: initial size in bytes. 1MB is enough for a full truecolor frame on a ~250x70 terminal. """
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.length = 0
+        """ Number of bytes currently in the buffer. """
+
+    def clear(self) -> None:
+        """ Empties the buffer (keeps the memory). """
+        self.length = 0
+
+    def _reserve(self, n: int) -> None:
+        """ Makes sure n more bytes fit, growing (doubling) the buffer if needed. """
+        needed = self.length + n
+        if needed <= len(self.buffer):
+            return
+
+        capacity = len(self.buffer)
+        while capacity < needed:
+            capacity *= 2
+
+        new_buffer = bytearray(capacity)
+        new_buffer[:self.length] = self.view[:self.length]
+        self.view.release()
+        self.buffer = new_buffer
+        self.view = memoryview(self.buffer)
+
+    def write(self, data) -> None:
+        """ Appends bytes (or any bytes-like object, e.g. a uint8 numpy array) to the buffer. """
+        n = len(data) if not isinstance(data, np.ndarray) else data.nbytes
+        self._reserve(n)
+        self.view[self.length:self.length+n] = data
+        self.length += n
+
+    def getvalue(self) -> memoryview:
+        """ View of the bytes currently in the buffer. Only valid until the next write. """
+        return self.view[:self.length]
+
+    def flush(self, fd: int | None = None) -> int:
+        """ Writes the buffer to `fd` (default: stdout) with as few `os.write` calls as possible, then clears it.
+        Returns the number of bytes written. """
+        sys.stdout.flush() # anything print()ed before has to go out first
+        if fd is None:
+            fd = sys.stdout.fileno()
+
+        n = self.length
+        write_all(fd, self.view[:n])
+        self.clear()
+        return n
@@ -0,0 +1,118 @@
+"""
+Color modes for terminals without truecolor support: xterm-256 (`38;5;n`) and the basic 16 colors.
+
+RGB -> palette mapping goes through a precomputed 64x64x64 lookup table (6 bits per channel), so a whole frame
+gets mapped with one numpy indexing operation instead of a nearest-color search per pixel.
+"""
+
+from typing import Dict, Literal
+import numpy as np
+
+ColorMode = Literal["truecolor", "256", "16"]
+
+_CUBE_LEVELS = [0, 95, 135, 175, 215, 255]
+
+def _xterm_256() -> np.ndarray:
+    """ (256, 3) rgb of the xterm 256 color palette. The first 16 depend on the terminal's theme,
+    so they get the usual xterm defaults here but never get picked (see `_PICKABLE`). """
+    colors = np.zeros((256, 3), dtype=np.uint8)
+    colors[:16] = _XTERM_16
+    i = 16
+    for r in _CUBE_LEVELS:
+        for g in _CUBE_LEVELS:
+            for b in _CUBE_LEVELS:
+                colors[i] = (r, g, b)
+                i += 1
+    for k in range(24):
+        colors[232+k] = (8 + 10*k,)*3
+    return colors
+
+_XTERM_16 = np.array([
+    (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0), (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0), (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+], dtype=np.uint8)
+""" Default xterm colors for the 16 basic colors. The real ones depend on the terminal's theme. """
+
+PALETTES: Dict[str, np.ndarray] = {
+    "256": _xterm_256(),
+    "16": _XTERM_16,
+}
+""" rgb value of every palette index, per color mode. """
+
+_PICKABLE = {
+    "256": np.arange(16, 256),
+    "16": np.arange(16),
+}
+""" Palette indices colors can get mapped to, per color mode. """
+
+_LUT_BITS = 6
+""" Bits per channel the lookup table looks at. 5 isn't enough: e.g. gray 88 and cube color 95 share a 5-bit block,
+and a palette color has to map to itself (see `get_lut`). """
+_LUT_SHIFT = 8 - _LUT_BITS
+
+_luts: Dict[str, np.ndarray] = {}
+_reverse: Dict[str, tuple] = {}
+
+def get_lut(mode: ColorMode) -> np.ndarray:
+    """ (64, 64, 64) uint8 array: palette index of the closest color to every 6-bit rgb value. Built on first use.
+
+    The block a pickable palette color is in always maps to that color, so snapping is idempotent: a frame that's
+    already made of palette colors stays the same (see `snap_to_palette`). """
+    if mode not in _luts:
+        pickable = _PICKABLE[mode]
+        palette = PALETTES[mode][pickable]
+        candidates = palette.astype(np.int32)
+
+        # center of every block of rgb values
+        size = 1 << _LUT_BITS
+        levels = (np.arange(size, dtype=np.int32) << _LUT_SHIFT) + (1 << _LUT_SHIFT) // 2
+        grid = np.stack(np.meshgrid(levels, levels, indexing="ij"), axis=-1).reshape(-1, 2)
+
+        # |a-b|^2 = |a|^2 - 2ab + |b|^2, and |a|^2 is the same for every candidate. one red level at a time,
+        # so the distances never need more than size^2 x candidates at once
+        lut = np.empty((size, size, size), dtype=np.uint8)
+        base = (candidates ** 2).sum(axis=1) - 2 * grid[:, 0:1] * candidates[:, 1] - 2 * grid[:, 1:2] * candidates[:, 2]
+        for r in range(size):
+            dists = base - 2 * levels[r] * candidates[:, 0]
+            lut[r] = pickable[np.argmin(dists, axis=1)].reshape(size, size)
+
+        blocks = palette >> _LUT_SHIFT
+        assert len(np.unique(blocks, axis=0)) == len(blocks), f"[palette]: two {mode} colors share a lookup table block"
+        lut[blocks[:, 0], blocks[:, 1], blocks[:, 2]] = pickable
+        _luts[mode] = lut
+    return _luts[mode]
+
+def to_palette_index(pixels: np.ndarray, mode: ColorMode) -> np.ndarray:
+    """ Palette index of every pixel of a (..., 3) uint8 array, through the lookup table. """
+    lut = get_lut(mode)
+    return lut[pixels[..., 0] >> _LUT_SHIFT, pixels[..., 1] >> _LUT_SHIFT, pixels[..., 2] >> _LUT_SHIFT]
+
+def snap_to_palette(pixels: np.ndarray, mode: ColorMode) -> None:
+    """ Replaces every pixel of a (..., 3) uint8 array with the rgb of its palette color, in place.
+    Afterwards, two pixels are equal exactly when they map to the same palette index. Snapping again changes nothing. """
+    pixels[...] = PALETTES[mode][to_palette_index(pixels, mode)]
+
+def palette_index_of(colors: np.ndarray, mode: ColorMode) -> np.ndarray:
+    """ Palette index of colors that are already palette colors (see `snap_to_palette`). Exact, unlike `to_palette_index`,
+    which only looks at 6 bits per channel. """
+    if mode not in _reverse:
+        palette = PALETTES[mode].astype(np.int32)
+        pickable = _PICKABLE[mode]
+        keys = (palette[pickable, 0] << 16) | (palette[pickable, 1] << 8) | palette[pickable, 2]
+        order = np.argsort(keys)
+        _reverse[mode] = (keys[order], pickable[order])
+
+    sorted_keys, indices = _reverse[mode]
+    colors = colors.astype(np.int32)
+    keys = (colors[..., 0] << 16) | (colors[..., 1] << 8) | colors[..., 2]
+    return indices[np.searchsorted(sorted_keys, keys)]
+
+def color_mode_for(term) -> ColorMode:
+    """ Best color mode a blessed Terminal says it supports. Plenty of terminals support truecolor without saying so,
+    so this is only a guess. """
+    colors = term.number_of_colors
+    if colors >= 1 << 24:
+        return "truecolor"
+    if colors >= 256:
+        return "256"
+    return "16"
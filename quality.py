@@ -0,0 +1,133 @@
+from typing import TYPE_CHECKING, List, NamedTuple
+from camera_frame import CameraFrame
+if TYPE_CHECKING:
+    from frame_writer import FrameWriter
+
+class QualityLevel(NamedTuple):
+    color_bits: int
+    """ Bits kept per color channel (8 = full truecolor). See `CameraFrame.quantize`. """
+    tolerance: int
+    """ Diff tolerance passed to `CameraFrame.render`. """
+    downsample: int
+    """ Source resolution divider (1 = full resolution). See `CameraFrame.pixelate`. """
+
+DEFAULT_LEVELS: List[QualityLevel] = [
+    QualityLevel(8, 0, 1),
+    QualityLevel(6, 0, 1),
+    QualityLevel(6, 8, 1),
+    QualityLevel(5, 16, 1),
+    QualityLevel(5, 16, 2),
+    QualityLevel(4, 24, 2),
+    QualityLevel(4, 32, 4),
+]
+""" Best -> worst. Every step makes frames cheaper to print: fewer distinct colors, fewer cells counting as changed, fewer pixels. """
+
+class QualityController:
+    """
+    Adapts the render quality to what the terminal can take in, to hold the target fps instead of falling behind.
+
+    After every frame, `record` gets the frame's size in bytes and how long rendering + writing it took. That time
+    (or, with a `FrameWriter`, whichever is worse: that, or the writer thread's time per frame in `os.write`)
+    is compared to the frame period:
+    - over `high` (fraction of the period) for `patience_down` frames in a row -> one level worse
+    - under `low` for `patience_up` frames in a row -> one level better
+
+    Stepping down is quick and stepping up is slow, so the quality doesn't flicker between two levels. After every change,
+    nothing happens for a few frames, until the moving average mostly reflects the new level.
+
+    Used by `FramePresenter(quality=...)`, which calls `apply` on every frame before rendering it and `record` after.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        levels: List[QualityLevel] = DEFAULT_LEVELS,
+        writer: "FrameWriter | None" = None,
+        high: float = 0.85,
+        low: float = 0.5,
+        patience_down: int = 3,
+        patience_up: int = 30,
+        smoothing: float = 0.2
+    ) -> None:
+        self.period = 1 / fps
+        self.levels = levels
+        self.writer = writer
+        self.high = high
+        self.low = low
+        self.patience_down = patience_down
+        self.patience_up = patience_up
+        self.smoothing = smoothing
+
+        self.level = 0
+        """ Index into `levels` of the current quality level. """
+
+        self.avg_time = 0.0
+        """ Smoothed (exponential moving average) time per frame, in seconds. """
+        self.avg_bytes = 0.0
+        """ Smoothed bytes per frame. """
+        self.throughput = 0.0
+        """ Estimated terminal throughput in bytes/second (only known with a `writer`). """
+
+        self._over = 0
+        self._under = 0
+        self._cooldown = 0
+        self._writer_frames = 0
+        self._writer_time = 0.0
+        self.changes = 0
+        """ Number of times the level changed. """
+
+    @property
+    def current(self) -> QualityLevel:
+        return self.levels[self.level]
+
+    def apply(self, frame: CameraFrame) -> None:
+        """ Lowers the resolution/colors of a frame that's about to be rendered, according to the current level. """
+        level = self.current
+        frame.pixelate(level.downsample)
+        frame.quantize(level.color_bits)
+
+    def _write_latency(self) -> float:
+        """ Average time the writer thread spent in `os.write` per frame, since the last call. 0 without a writer. """
+        if self.writer is None:
+            return 0.0
+
+        frames = self.writer.frames_written - self._writer_frames
+        seconds = self.writer.write_time - self._writer_time
+        self._writer_frames, self._writer_time = self.writer.frames_written, self.writer.write_time
+        return seconds / frames if frames > 0 else 0.0
+
+    def record(self, n_bytes: int, seconds: float) -> None:
+        """ Call after every rendered frame with its size and how long rendering (+ writing) it took. Might change the level. """
+        latency = self._write_latency()
+        if latency > 0 and n_bytes > 0:
+            self.throughput = n_bytes / latency
+
+        a = self.smoothing
+        self.avg_time += a * (max(seconds, latency) - self.avg_time)
+        self.avg_bytes += a * (n_bytes - self.avg_bytes)
+
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            return
+
+        load = self.avg_time / self.period
+        self._over = self._over + 1 if load > self.high else 0
+        self._under = self._under + 1 if load < self.low else 0
+
+        if self._over >= self.patience_down and self.level < len(self.levels)-1:
+            self._set_level(self.level + 1)
+        elif self._under >= self.patience_up and self.level > 0:
+            self._set_level(self.level - 1)
+
+    def _set_level(self, level: int) -> None:
+        self.level = level
+        self.changes += 1
+        self._over = self._under = 0
+        self._cooldown = int(2 / self.smoothing) # ~90% of the average comes from after the change by then
+
+    def report(self) -> str:
+        """ One line summary of the controller's state. """
+        return (
+            f"[QualityController] level {self.level}/{len(self.levels)-1} {tuple(self.current)}, {self.changes} changes. "
+            f"avg {self.avg_time*1000:.1f}ms / {self.avg_bytes:.0f} bytes per frame, terminal ~{self.throughput/1e6:.2f}MB/s"
+        )
@@ -0,0 +1,129 @@
+"""
+Per-frame render metrics: where the frame time goes (diff / encode / write) and how much output it made.
+
+Every render records one row into a fixed-size ring (a numpy structured array allocated once), so recording
+costs the same on frame 10 and on frame 100000, and memory stays bounded no matter how long it runs.
+"""
+
+import csv
+import json
+from typing import Dict, List
+import numpy as np
+
+RENDERERS = (
+    "render", "render_intervaled", "render_parallel", "render_raw",
+    "render_bufferlist", "render_usingwhile", "render2_usingdists", "render3_iterpixelidxs"
+)
+""" Renderer names, by the id stored in the `renderer` field. """
+
+RECORD = np.dtype([
+    ("frame", np.int64),        # running number of the frame (counts frames that fell out of the ring too)
+    ("renderer", np.int8),      # index into RENDERERS
+    ("diff_time", np.float64),  # seconds spent finding what changed
+    ("encode_time", np.float64),# seconds spent turning the changes into bytes
+    ("write_time", np.float64), # seconds spent in `TermState.flush` (only handing the frame over, with a FrameWriter)
+    ("dirty_rows", np.int32),   # rows of characters with anything printed on them
+    ("dirty_cells", np.int32),  # cells printed (including repainted gaps)
+    ("sgr", np.int32),          # color escape sequences
+    ("moves", np.int32),        # cursor moves
+    ("bytes", np.int64),        # bytes in the frame
+])
+""" One record per rendered frame. Counts are -1 where a renderer can't tell: those are left out of `summary`,
+and come out empty (None) in `rows`/`dump`. """
+
+_TIMES = ("diff_time", "encode_time", "write_time")
+_COUNTS = ("dirty_rows", "dirty_cells", "sgr", "moves", "bytes")
+_PERCENTILES = (50, 95, 99)
+
+class RenderMetrics:
+    """
+    Ring of the last `capacity` frames' metrics. Turn it on by setting `stuff.term_state.metrics`; the renderers
+    record into it themselves.
+
+    ```python
+    metrics = stuff.term_state.metrics = RenderMetrics()
+    ... # play
+    Logger.log(metrics.report())
+    metrics.dump("metrics.csv")
+    ```
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=RECORD)
+        """ The ring. Only the first `min(count, capacity)` rows are used; see `recent()` for them in order. """
+        self.count = 0
+        """ Frames recorded so far (can be more than `capacity`). """
+
+    def record(
+        self, renderer: str, diff_time: float, encode_time: float, write_time: float,
+        dirty_rows: int, dirty_cells: int, sgr: int, moves: int, n_bytes: int
+    ) -> None:
+        """ Adds one frame's metrics, overwriting the oldest one if the ring is full. """
+        self.records[self.count % self.capacity] = (
+            self.count, RENDERERS.index(renderer), diff_time, encode_time, write_time,
+            dirty_rows, dirty_cells, sgr, moves, n_bytes
+        )
+        self.count += 1
+
+    def recent(self) -> np.ndarray:
+        """ The recorded frames that are still in the ring, oldest first. """
+        if self.count <= self.capacity:
+            return self.records[:self.count]
+        split = self.count % self.capacity
+        return np.concatenate((self.records[split:], self.records[:split]))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """ p50/p95/p99 (+ mean and max) of every field over the frames in the ring. Times in milliseconds.
+        Frames that couldn't tell a count (-1) are left out of that count's numbers. """
+        records = self.recent()
+        result = {}
+        for name in _TIMES + ("total_time",) + _COUNTS:
+            if name == "total_time":
+                values = (records["diff_time"] + records["encode_time"] + records["write_time"]) * 1000
+            elif name in _TIMES:
+                values = records[name] * 1000
+            else:
+                values = records[name][records[name] >= 0]
+            if len(values) == 0:
+                continue
+            p = np.percentile(values, _PERCENTILES)
+            result[name] = {
+                **{f"p{q}": float(v) for q, v in zip(_PERCENTILES, p)},
+                "mean": float(values.mean()), "max": float(values.max()),
+            }
+        return result
+
+    def report(self) -> str:
+        """ Multi-line summary (see `summary`). """
+        lines = [f"[RenderMetrics] {self.count} frames, last {len(self.recent())}:"]
+        for name, s in self.summary().items():
+            unit = "ms" if name.endswith("_time") else ""
+            lines.append(
+                f"  {name:<12} p50 {s['p50']:.2f}{unit}  p95 {s['p95']:.2f}{unit}  p99 {s['p99']:.2f}{unit}  max {s['max']:.2f}{unit}"
+            )
+        return "\n".join(lines)
+
+    def rows(self) -> List[dict]:
+        """ The frames in the ring as dicts (renderer by name), oldest first. Counts a renderer couldn't tell are None. """
+        names = RECORD.names
+        rows = []
+        for values in self.recent().tolist():
+            row = dict(zip(names, values))
+            row["renderer"] = RENDERERS[row["renderer"]]
+            for name in _COUNTS:
+                if row[name] < 0:
+                    row[name] = None
+            rows.append(row)
+        return rows
+
+    def dump(self, path: str) -> None:
+        """ Writes every frame in the ring to `path`: json (records + summary) if it ends with `.json`, otherwise csv. """
+        if path.endswith(".json"):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"summary": self.summary(), "frames": self.rows()}, f)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=RECORD.names)
+                writer.writeheader()
+                writer.writerows(self.rows())
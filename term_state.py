@@ -0,0 +1,179 @@
+from typing import Tuple
+import numpy as np
+from output_buffer import OutputBuffer
+from tile_hash import TileHasher
+from render_metrics import RenderMetrics
+from palette import ColorMode
+
+RGBTuple = Tuple[int, int, int]
+
+UNKNOWN_ERROR = np.iinfo(np.int32).max
+""" `TermState.screen_error` of cells nothing is known about (never synced, or invalidated). """
+
+def _cuf(n: int) -> bytes:
+    """ Cursor forward (CUF) by n columns. `\\033[C` already means 1 column. """
+    return b'\033[C' if n == 1 else b'\033[%dC' % n
+
+def _cup(x: int, y: int) -> bytes:
+    """ Absolute cursor position (CUP), 0-based x and y. Same thing `term.move_xy` gives on ansi terminals. """
+    return b'\033[%d;%dH' % (y+1, x+1)
+
+class TermState:
+    """
+    Model of the terminal as the renderer last left it: where the cursor is and which fg/bg colors are active.
+    Kept from one frame to the next, so the renderer can skip color codes that are already active
+    and use the shortest cursor move instead of an absolute move for every row.
+
+    Anything that prints to the terminal without going through this model (print3, log_on_screen, etc.)
+    should call `invalidate()` afterwards, so the next frame doesn't rely on stale state.
+    """
+
+    def __init__(self, term = None) -> None:
+        """ `term`: optional blessed Terminal, only used to read the width of the terminal. """
+
+        self.term = term
+
+        self.width: int | None = None
+        """ Width of the terminal in characters. Printing up to the last column leaves the cursor in a
+        weird "pending wrap" state, so we stop trusting the cursor position there. """
+
+        self.cursor: Tuple[int, int] | None = None
+        """ (x, y) of the cursor in characters, 0-based. None if unknown. """
+
+        self.fg: RGBTuple | None = None
+        """ Currently active fg color. None if unknown (or the terminal default). """
+        self.bg: RGBTuple | None = None
+        """ Currently active bg color. None if unknown (or the terminal default). """
+
+        self.buffer = OutputBuffer()
+        """ Reused every frame to build the bytes that get written to the terminal. """
+        self.spare_buffer = OutputBuffer()
+        """ Second buffer for renderers that encode a frame two ways and keep the shorter one (see `CameraFrame._print_spans`). """
+        self.fd: int | None = None
+        """ File descriptor the frames get written to. None means stdout. """
+
+        self.writer = None
+        """ Optional `FrameWriter` (background output thread). None means frames get written right away, on this thread. """
+
+        self.color_mode: ColorMode = "truecolor"
+        """ How colors get written: 24-bit (`truecolor`), xterm 256 colors (`256`) or the basic 16 colors (`16`).
+        In the palette modes, frames get snapped to palette colors before they're diffed (see `palette.py`).
+        `palette.color_mode_for(term)` guesses what the terminal supports. """
+
+        self.rep_threshold: int | None = None
+        """ Runs of identical cells that repeat a cell at least this many times get printed as one cell + REP (`\033[<n>b`).
+        None means off. Turn it on with `enable_rep`, which checks that the terminal supports REP first. """
+
+        self.pick_glyphs = True
+        """ Lets the encoder pick `▀`/`▄`/`█`/space per cell, whichever needs the fewest color changes.
+        False prints every cell as `▀` (top pixel = fg, bottom pixel = bg). """
+
+        self.tiles: TileHasher | None = None
+        """ Optional tile-digest change detector (see `TileHasher`). None means off. """
+
+        self.metrics: RenderMetrics | None = None
+        """ Optional per-frame metrics every render records into (see `RenderMetrics`). None means off. """
+        
+        self.screen: np.ndarray | None = None
+        """ What the renderer put on the screen, as pixels (2 per row of characters, like a frame's pixels).
+        Rendering with a diff tolerance compares frames against this instead of against the previous frame. """
+        self.screen_error: np.ndarray | None = None
+        """ For every cell of `screen`: upper bound of the (perceptual, see `get_cell_diffs`) difference between `screen` and
+        the last frame rendered there. 0 means the cell shows that frame exactly, `UNKNOWN_ERROR` means `screen` can't be
+        trusted there (nothing synced yet, or invalidated). """
+        
+        self.last_frame_bytes = 0
+        """ Size of the last frame that got flushed, in bytes. """
+
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """ Forget everything we know about the terminal. The next frame will start with an absolute
+        cursor move and emit both colors. Also re-reads the terminal width, in case it was resized. """
+        self.cursor = None
+        self.fg = None
+        self.bg = None
+        if self.screen_error is not None:
+            self.screen_error[:] = UNKNOWN_ERROR
+        if self.tiles is not None:
+            self.tiles.reset()
+        if self.term is not None:
+            self.width = self.term.width
+
+    def enable_rep(self, threshold: int = 2) -> bool:
+        """ Turns on REP encoding (see `rep_threshold`) if the terminal's terminfo has `rep`. Otherwise leaves it off,
+        and frames get printed cell by cell like before. Returns whether it got turned on. """
+        supported = self.term is not None and bool(self.term.rep)
+        self.rep_threshold = threshold if supported else None
+        return supported
+
+    def screen_view(self, pos: Tuple[int, int], width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Part of `screen` covered by a frame at `pos` (in pixels) of that size, and the matching part of `screen_error`
+        (one value per cell). Grows both if they're too small: the new cells are unknown, the old ones stay as they were. """
+        x, y = pos
+        if self.screen is None or self.screen.shape[0] < y+height or self.screen.shape[1] < x+width:
+            old_h, old_w = self.screen.shape[:2] if self.screen is not None else (0, 0)
+            screen = np.zeros((max(old_h, y+height), max(old_w, x+width), 3), dtype=np.uint8)
+            error = np.full((screen.shape[0]//2, screen.shape[1]), UNKNOWN_ERROR, dtype=np.int32)
+            if self.screen is not None:
+                screen[:old_h, :old_w] = self.screen
+                error[:old_h//2, :old_w] = self.screen_error
+            self.screen, self.screen_error = screen, error
+        return self.screen[y:y+height, x:x+width], self.screen_error[y//2:(y+height)//2, x:x+width]
+
+    def move_to(self, x: int, y: int) -> bytes:
+        """ Returns the shortest escape sequence that moves the cursor from where it is now to (x, y),
+        picking between nothing, CUF (same row, moving right), CR/LF (+ CUF), and CUP (absolute).
+        Updates the cursor position. """
+
+        cursor = self.cursor
+        self.cursor = (x, y)
+
+        if cursor is None:
+            return _cup(x, y)
+
+        cx, cy = cursor
+        if (cx, cy) == (x, y):
+            return b''
+
+        best = _cup(x, y)
+
+        if y == cy and x > cx:
+            cuf = _cuf(x-cx)
+            if len(cuf) < len(best):
+                best = cuf
+
+        # CR goes back to column 0, then LFs go down (never up, and never past the bottom since y is on screen)
+        if y >= cy:
+            crlf = b'\r' + b'\n'*(y-cy) + (_cuf(x) if x > 0 else b'')
+            if len(crlf) < len(best):
+                best = crlf
+
+        return best
+
+    def flush(self) -> int:
+        """ Writes everything in `buffer` to the terminal in one go (or hands it to the `writer` thread, if there is one).
+        Returns the number of bytes in the frame. """
+        if self.writer is not None:
+            self.last_frame_bytes = self.buffer.length
+            self.buffer = self.writer.submit(self.buffer)
+        else:
+            self.last_frame_bytes = self.buffer.flush(self.fd)
+        return self.last_frame_bytes
+
+    def drain(self) -> None:
+        """ Waits until every frame handed to the `writer` thread has actually been written.
+        Call before printing anything else to the terminal, so it doesn't end up in the middle of a frame. """
+        if self.writer is not None:
+            self.writer.drain()
+
+    def advance(self, n: int) -> None:
+        """ Call after printing `n` characters: moves the modelled cursor right by n. """
+        if self.cursor is None:
+            return
+
+        x = self.cursor[0] + n
+        if self.width is not None and x >= self.width:
+            self.cursor = None # pending wrap, don't trust relative moves from here
+        else:
+            self.cursor = (x, self.cursor[1])
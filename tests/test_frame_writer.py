@@ -0,0 +1,67 @@
+import os
+from threading import Thread
+from frame_writer import FrameWriter
+from output_buffer import OutputBuffer
+
+def _in_thread(fn, timeout=5):
+    """ Runs fn on a thread, fails the test if it doesn't finish in time (instead of hanging). Returns what it raised. """
+    result = {}
+    def run():
+        try:
+            fn()
+        except BaseException as e:
+            result["error"] = e
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{fn.__name__} hung"
+    return result.get("error")
+
+def test_closed_pipe_raises_instead_of_hanging():
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd) # nobody's reading: every write fails with EPIPE
+    writer = FrameWriter(write_fd, max_queued=1, buffer_capacity=64)
+    errors = []
+    def submit_frames():
+        buffer = OutputBuffer(64)
+        for _ in range(10): # more frames than the pool has buffers
+            buffer.write(b'frame')
+            try:
+                buffer = writer.submit(buffer)
+            except OSError as e:
+                errors.append(e)
+                buffer.clear()
+
+    assert _in_thread(submit_frames) is None
+    for call in (writer.drain, writer.close):
+        error = _in_thread(call)
+        if error is not None:
+            errors.append(error)
+    os.close(write_fd)
+
+    # raised exactly once, by whichever call came first after the write failed
+    assert len(errors) == 1 and isinstance(errors[0], BrokenPipeError)
+    assert writer.frames_written == 0
+
+def test_error_from_close():
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    writer = FrameWriter(write_fd, buffer_capacity=64)
+    buffer = OutputBuffer(64)
+    buffer.write(b'frame')
+    writer.submit(buffer) # the write fails on the thread, after this returned
+    assert isinstance(_in_thread(writer.close), BrokenPipeError)
+    os.close(write_fd)
+
+def test_writes_frames():
+    read_fd, write_fd = os.pipe()
+    writer = FrameWriter(write_fd, buffer_capacity=64)
+    buffer = OutputBuffer(64)
+    for k in range(3):
+        buffer.write(b'frame%d;' % k)
+        buffer = writer.submit(buffer)
+    writer.close()
+    os.close(write_fd)
+    assert os.read(read_fd, 1024) == b'frame0;frame1;frame2;'
+    os.close(read_fd)
+    assert writer.error is None and writer.frames_written == 3
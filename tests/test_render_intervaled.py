@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from blessed import Terminal
+from gd_constants import stuff
+stuff.term = Terminal(kind='xterm-256color', force_styling=True)
+from camera_frame import CameraFrame
+from term_state import TermState
+from utils import get_cell_diffs, get_frame_diff_intervals
+from virtual_terminal import VirtualTerminal
+
+W, H = 24, 12
+
+def _frame(pixels):
+    frame = CameraFrame((W, H))
+    frame.pixels[:] = pixels
+    frame.mark_dirty(0, 0, W, H)
+    return frame
+
+def _bytes_for(prev, cur, color_mode, rep_threshold, draw):
+    """ Puts `prev` on a fresh virtual terminal, then calls draw(frame of `cur`, frame of `prev`).
+    Returns (bytes draw printed, pixels on the screen after, frame of `cur`). """
+    vt = VirtualTerminal(W, H//2)
+    state = TermState(stuff.term)
+    state.width = W
+    state.writer = vt
+    state.color_mode = color_mode
+    state.rep_threshold = rep_threshold
+    stuff.term_state = state
+
+    prev_frame = _frame(prev)
+    prev_frame.render_full()
+    start = sum(entry[1] for entry in vt.stats.values())
+    frame = _frame(cur)
+    draw(frame, prev_frame)
+    return sum(entry[1] for entry in vt.stats.values()) - start, vt.pixels(), frame
+
+def _print_intervals(frame, prev_frame):
+    """ Just the diff intervals, no gaps bridged. """
+    frame._apply_color_mode()
+    rows, starts, ends = get_frame_diff_intervals(get_cell_diffs(frame.pixels, prev_frame.pixels))
+    frame._print_spans(rows, starts, ends-1, "render_intervaled")
+
+@pytest.mark.parametrize("color_mode", ["truecolor", "256", "16"])
+@pytest.mark.parametrize("rep_threshold", [None, 2])
+def test_never_more_bytes_than_render_or_plain_intervals(color_mode, rep_threshold):
+    rng = np.random.default_rng(5)
+    for _ in range(100):
+        # few colors, so there's lots of glyph picking and repeats going on
+        palette = rng.integers(0, 256, (int(rng.integers(2, 6)), 3), dtype=np.uint8)
+        prev = palette[rng.integers(0, len(palette), (H, W))]
+        cur = prev.copy()
+        changed = rng.random((H, W)) < rng.uniform(0.05, 0.7)
+        cur[changed] = palette[rng.integers(0, len(palette), changed.sum())]
+
+        intervaled, screen, frame = _bytes_for(prev, cur, color_mode, rep_threshold, CameraFrame.render_intervaled)
+        rendered, _, _ = _bytes_for(prev, cur, color_mode, rep_threshold, CameraFrame.render)
+        plain, _, _ = _bytes_for(prev, cur, color_mode, rep_threshold, _print_intervals)
+
+        assert (screen == frame.pixels).all() # snapped to the palette in 256/16 color mode
+        assert intervaled <= rendered
+        assert intervaled <= plain
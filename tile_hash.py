@@ -0,0 +1,117 @@
+from typing import Dict, List, Tuple
+import numpy as np
+
+class TileHasher:
+    """
+    Optional change detector for big frames. Splits the frame into tiles of `tile_size` characters (8x8 by default,
+    so 8 columns x 16 rows of pixels) and keeps a 64-bit digest of every tile of the last frame that was rendered,
+    per area of the screen (frames at different positions don't get compared with each other).
+
+    Hashing only has to read the new frame once, instead of comparing two whole (h, w, 3) frames, and only the
+    tiles whose digest changed get diffed pixel by pixel afterwards.
+
+    Plug it in with `stuff.term_state.tiles = TileHasher()`. It gets reset whenever the terminal state is invalidated.
+    """
+
+    def __init__(self, tile_size: Tuple[int, int] = (8, 8)) -> None:
+        """ `tile_size`: (width, height) of a tile in characters. """
+        self.tile_w = tile_size[0]
+        """ Tile width in pixels (= characters). """
+        self.tile_h = tile_size[1] * 2
+        """ Tile height in pixels (2 per character). """
+
+        self.digests: Dict[Tuple[int, int, int, int], np.ndarray] = {}
+        """ (x, y, width, height) in pixels of an area of the screen -> (tile rows, tile cols) digests of the last frame
+        rendered there. Areas that aren't in here have nothing to compare against. """
+
+        self.last_skipped = 0
+        """ Number of tiles that were skipped (same digest) in the last frame. """
+        self.last_total = 0
+        """ Number of tiles in the last frame. """
+        self.total_skipped = 0
+        """ Number of tiles skipped since this was created. """
+
+        self._weights_cache = {}
+        """ (rows, cols, unit size) -> weight array for `digest`, so they only get built once per frame size. """
+
+    def reset(self) -> None:
+        """ Forget every frame, so every tile counts as changed next time. """
+        self.digests.clear()
+
+    def forget(self, pos: Tuple[int, int], width: int, height: int) -> None:
+        """ Forget the digests of every area that overlaps this one (in pixels), e.g. after something got printed there
+        without going through `update`. """
+        x, y = pos
+        for key in list(self.digests):
+            kx, ky, kw, kh = key
+            if kx < x+width and x < kx+kw and ky < y+height and y < ky+kh:
+                del self.digests[key]
+
+    def _weights(self, rows: int, cols: int, units_per_tile: int) -> np.ndarray:
+        """ Random odd multiplier for every unit (byte or 8-byte word) position of a (rows, cols) array, repeating every tile.
+        Odd means changing any single unit always changes the digest. """
+        key = (rows, cols, units_per_tile)
+        if key not in self._weights_cache:
+            rng = np.random.default_rng(units_per_tile)
+            tile_weights = rng.integers(0, 2**63, (self.tile_h, units_per_tile), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+            self._weights_cache[key] = np.tile(tile_weights, (-(-rows // self.tile_h), -(-cols // units_per_tile)))[:rows, :cols]
+        return self._weights_cache[key]
+
+    def _sum_tiles(self, units: np.ndarray, units_per_tile: int) -> np.ndarray:
+        """ Weighted sum (wrapping around at 2^64, fine for a hash) of every tile of a (rows, cols) array of bytes or words. """
+        weighted = units * self._weights(units.shape[0], units.shape[1], units_per_tile)
+        col_starts = np.arange(0, units.shape[1], units_per_tile)
+        row_starts = np.arange(0, units.shape[0], self.tile_h)
+        return np.add.reduceat(np.add.reduceat(weighted, col_starts, axis=1), row_starts, axis=0)
+
+    def digest(self, pixels: np.ndarray) -> np.ndarray:
+        """ Returns the (tile rows, tile cols) uint64 digests of a (h, w, 3) frame. Tiles on the right/bottom edges can be smaller. """
+        h, w = pixels.shape[:2]
+        row_bytes = np.ascontiguousarray(pixels).reshape(h, w*3)
+
+        # full tiles are read as 8-byte words when a tile row is a whole number of words (3 words for 8 px wide tiles),
+        # which keeps the hashing about as cheap as reading the frame once
+        full_w = (w // self.tile_w) * self.tile_w
+        if (self.tile_w*3) % 8 != 0 or full_w == 0:
+            return self._sum_tiles(row_bytes, self.tile_w*3)
+
+        words = row_bytes[:, :full_w*3].view(np.uint64)
+        digests = self._sum_tiles(words, self.tile_w*3 // 8)
+        if full_w == w:
+            return digests
+
+        # last partial column of tiles, byte by byte
+        edge = self._sum_tiles(row_bytes[:, full_w*3:], self.tile_w*3)
+        return np.concatenate((digests, edge), axis=1)
+
+    def update(self, pixels: np.ndarray, pos: Tuple[int, int] = (0, 0)) -> np.ndarray:
+        """ Hashes a frame that's about to be rendered at `pos` (in pixels), compares it with the last one rendered there
+        and remembers the new digests. Returns a (tile rows, tile cols) bool array of the tiles that changed. """
+        digests = self.digest(pixels)
+        key = (pos[0], pos[1], pixels.shape[1], pixels.shape[0])
+        last = self.digests.pop(key, None)
+        # whatever else this frame gets printed over doesn't match its digests anymore
+        self.forget(pos, pixels.shape[1], pixels.shape[0])
+
+        if last is None or last.shape != digests.shape:
+            changed = np.ones(digests.shape, dtype=bool)
+        else:
+            changed = digests != last
+
+        self.digests[key] = digests
+        self.last_total = changed.size
+        self.last_skipped = int(changed.size - np.count_nonzero(changed))
+        self.total_skipped += self.last_skipped
+        return changed
+
+    def changed_bands(self, changed: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """ Turns the output of `update` into a list of (y1, y2, x1, x2) pixel rectangles (exclusive), one per row of tiles
+        that has changes, covering the changed tiles of that row. """
+        bands = []
+        for tile_row in np.flatnonzero(changed.any(axis=1)).tolist():
+            cols = np.flatnonzero(changed[tile_row])
+            bands.append((
+                tile_row*self.tile_h, (tile_row+1)*self.tile_h,
+                int(cols[0])*self.tile_w, (int(cols[-1])+1)*self.tile_w
+            ))
+        return bands
@@ -9,7 +9,9 @@ from gd_constants import stuff
 
 def print3(text: str) -> None:
     """ Slightly faster (?) print3, which uses sys.stdout.write instead of print. Still adds the reset code at the end. """
+    stuff.term_state.drain() # frames still queued on the writer thread have to go out first
     sys.stdout.write(text + '\r\x1b[0m')
+    stuff.term_state.invalidate() # colors got reset and we don't know where the cursor is anymore
     
 def fcode(fg: Union[str, tuple] = None, bg: Union[str, tuple] = None) -> str:
     '''
@@ -159,7 +161,7 @@ def blend_pixels(original, new):
     # calculate the new rgb
     rgb = tuple(int((new_rgb[i]*new_alpha + dest_rgb[i]*dest_alpha*(1 - new_alpha/255)) / alpha) for i in range(3))
     
-    Logger.log(f"[blend_pixels] blended {original} with {new} to get {rgb + (alpha,)}")
+    Logger.debug("[blend_pixels] blended %s with %s to get %s", original, new, rgb + (alpha,))
     return rgb + (alpha,)
 
 def blend_rgba_onto_rgb(original: np.ndarray, new: np.ndarray) -> np.ndarray:
@@ -246,10 +248,9 @@ def blend_multiple_pixels(dstacked_pixels: np.ndarray):
     Pixels should be in order of how they should be blended.
     """
     
-    Logger.log(f"blend_multiple_pixels: dstacked_pxs shape is {dstacked_pixels.shape}")
     num_pixels = dstacked_pixels.shape[0] // 4
-    Logger.log(f"blending {num_pixels} pixels")
-    Logger.log(f"pixels: {dstacked_pixels}")
+    Logger.debug("blend_multiple_pixels: blending %d pixels, dstacked_pxs shape is %s", num_pixels, dstacked_pixels.shape)
+    Logger.debug("pixels: %s", dstacked_pixels)
     
 
     blended = blend_pixels(dstacked_pixels[:4], dstacked_pixels[4:8])
@@ -405,6 +406,68 @@ def get_diff_intervals(arr1: np.ndarray, arr2: np.ndarray) -> Tuple[np.ndarray,
     
     return starts, ends
 
+def get_cell_diffs(pixels1: np.ndarray, pixels2: np.ndarray, tolerance: int = 0) -> np.ndarray:
+    """
+    Compares two whole frames of pixels (both shape (h, w, 3), h even) in a single pass.
+
+    Returns a 2D bool array of shape (h//2, w): True where the terminal cell (2 stacked pixels)
+    at that row/column is different between the two frames.
+    
+    With a `tolerance`, a pixel only counts as changed if the perceptual distance between its two colors is more than that.
+    The distance is the difference of every channel, weighted roughly like luma (green counts the most, blue the least),
+    on the same 0-255 scale: (2*dr + 4*dg + 3*db) / 9.
+    """
+    if tolerance > 0:
+        # max - min instead of abs(a - b), so uint8 doesn't wrap around
+        d = (np.maximum(pixels1, pixels2) - np.minimum(pixels1, pixels2)).astype(np.uint16)
+        diffs = 2*d[..., 0] + 4*d[..., 1] + 3*d[..., 2] > 9*tolerance
+    else:
+        diffs = np.any(pixels1 != pixels2, axis=2) # (h, w), True if pixel changed
+    return diffs[0::2] | diffs[1::2] # a cell changes if either its top or bottom pixel changed
+
+def get_diff_bounds(cell_diffs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Given a 2D bool array of changed cells (see `get_cell_diffs`), returns a tuple of 1D int arrays (starts, ends),
+    one element per cell row: the first and last (inclusive) changed column of that row.
+
+    Rows with no changes get -1 for both start and end.
+    """
+    has_diffs = cell_diffs.any(axis=1)
+    starts = np.argmax(cell_diffs, axis=1)
+    ends = cell_diffs.shape[1] - 1 - np.argmax(cell_diffs[:, ::-1], axis=1)
+
+    starts[~has_diffs] = -1
+    ends[~has_diffs] = -1
+
+    return starts, ends
+
+def get_frame_diff_bounds(pixels1: np.ndarray, pixels2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Whole-frame replacement for calling `first_diff_color`/`last_diff_color` on every pair of pixel rows.
+
+    Returns (starts, ends): for each cell row (pair of pixel rows), the first and last (inclusive)
+    column that is different between the two frames, or -1 for both if the row didn't change.
+    """
+    return get_diff_bounds(get_cell_diffs(pixels1, pixels2))
+
+def get_frame_diff_intervals(cell_diffs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Whole-frame version of `get_diff_intervals` + `combine_intervals`. Given a 2D bool array of changed cells
+    (see `get_cell_diffs`), returns a tuple of 1D arrays (rows, starts, ends), one element per interval of changed cells.
+
+    Intervals go from start -> end-1 (end is exclusive), and are ordered by row, then by start.
+    """
+
+    padded = np.zeros((cell_diffs.shape[0], cell_diffs.shape[1]+2), dtype=np.int8)
+    padded[:, 1:-1] = cell_diffs
+    changes = np.diff(padded, axis=1) # 1 where an interval starts, -1 where one ends
+
+    # nonzero goes in row-major order, so starts and ends pair up one to one
+    rows, starts = np.nonzero(changes == 1)
+    _, ends = np.nonzero(changes == -1)
+
+    return rows, starts, ends
+
 def combine_intervals(starts1: np.ndarray, ends1: np.ndarray, starts2: np.ndarray, ends2: np.ndarray) -> List[Tuple[int, int]]:
     """ Combines arbitrary intervals defined by starts1, ends1, and starts2, 
     ends2 into one giant LIST of intervals (tuple (start, end), exclusive of end).
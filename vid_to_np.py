@@ -1,55 +1,133 @@
+from typing import Callable, Iterator, Tuple
 import cv2
 import numpy as np
 
-def extract_frames(video_path, fps=30, width=None, height=None):
+BAD_APPLE_PATH = './badapple72p.mp4'
+BAD_APPLE_STORE = './badapple.frames'
+""" Where `python frame_store.py` output for bad apple is looked for (see `FrameStore`). """
+BAD_APPLE_DELTAS = './badapple.deltas'
+""" Where `python delta_stream.py compile` output for bad apple is looked for (see `DeltaStream`). """
+
+def fit_size(src_width: int, src_height: int, width: int | None = None, height: int | None = None) -> Tuple[int, int]:
+    """ Biggest size with the source's aspect ratio that fits in `width` x `height` (either can be None = no limit),
+    with the height snapped down to an even number, since CameraFrames need that. """
+    scales = [limit / src for limit, src in ((width, src_width), (height, src_height)) if limit is not None]
+    scale = min(scales) if scales else 1.0
+
+    out_width = max(1, round(src_width * scale))
+    if width is not None:
+        out_width = min(out_width, width)
+    out_height = max(2, int(src_height * scale) // 2 * 2)
+    return out_width, out_height
+
+def _video_info(video) -> Tuple[float, int]:
+    """ (fps, frame count) of an opened video. fps is 0 if the container doesn't say. """
+    return video.get(cv2.CAP_PROP_FPS), int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+
+def count_frames(video_path, fps=30) -> int:
+    """ How many frames `iter_frames` is going to yield, from the video's metadata (no decoding).
+    Some containers don't store an exact frame count, so this can be a bit off. """
     video = cv2.VideoCapture(video_path)
-    
-    # Get the original FPS of the video
-    original_fps = video.get(cv2.CAP_PROP_FPS)
-    
-    # Calculate the interval between frames to capture based on the desired FPS
-    frame_interval = int(original_fps // fps)
-    
-    # Initialize a list to store the frames
-    frames = []
-    
-    # Initialize a frame counter
-    frame_count = 0
-    
-    while True:
-        # Read a frame from the video
-        
-        ret, frame = video.read()
-        
-        if not ret:
-            print(f"\ndone reading frames")
-            break
-        
-        # If the current frame is at the interval, store it
-        if frame_count % frame_interval == 0:
-            frame_count += 1
-            #if width is not None and height is not None:
-            #    frame = cv2.resize(frame, (width, height))
-            frames.append(frame)
-            print(f"recording frame {frame_count}")
-        else:
-            frame_count += 1
-            print(f"skipping frame {frame_count}")
-            continue
-    
-    # Release the video object
+    original_fps, total = _video_info(video)
     video.release()
-    
-    # Convert the list of frames to a NumPy array
-    print("numpy izing")
-    frames_array = np.array(frames)
-    print(f"donezo, shape: {frames_array.shape}")
-    
-    return frames_array
 
-def get_bad_apple() -> np.ndarray:
+    if original_fps <= 0:
+        original_fps = fps
+    # output frame k shows source frame round(k * original_fps / fps), see iter_frames
+    return max(0, int(np.ceil((total - 0.5) * fps / original_fps)))
+
+def iter_frames(video_path, fps=30, width=None, height=None, grayscale=False) -> Iterator[np.ndarray]:
+    """ Yields the frames of a video one at a time, as they get decoded, as (h, w, 3) uint8 rgb arrays.
+    Only one frame is in memory at a time, so playback can start as soon as the first one is ready.
+
+    - `fps`: output frame rate. Output frame k is whatever the video shows at k/fps seconds (the closest source
+    frame), so this works for any source fps: lower ones repeat frames (the same array again), higher ones skip them.
+    - `width`/`height`: box (in pixels) the frames get scaled down/up to fit in, keeping the aspect ratio.
+    The height always ends up even (see `fit_size`). None keeps the source size (height still snapped to even).
+    - `grayscale`: convert to gray (still 3 channels). Cheaper to print, since compression noise can't tint the colors.
+    """
+    video = cv2.VideoCapture(video_path)
+    original_fps, _ = _video_info(video)
+    if original_fps <= 0:
+        original_fps = fps # unknown, assume it's already what we want
+
+    src_width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+    src_height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    size = fit_size(src_width, src_height, width, height)
+    conversion = cv2.COLOR_BGR2GRAY if grayscale else cv2.COLOR_BGR2RGB
+
+    grabbed = -1 # index of the last source frame grabbed
+    decoded = -1 # index of the source frame in `frame`
+    frame = None
+    k = 0
+    try:
+        while True:
+            # source frame on screen at k/fps seconds
+            target = round(k * original_fps / fps)
+
+            # frames in between only get skipped over (grab without decoding them into an image)
+            while grabbed < target:
+                if not video.grab():
+                    return
+                grabbed += 1
+
+            if decoded != target:
+                ret, raw = video.retrieve()
+                if not ret:
+                    return
+                if (src_width, src_height) != size:
+                    raw = cv2.resize(raw, size, interpolation=cv2.INTER_AREA)
+                frame = cv2.cvtColor(raw, conversion)
+                if grayscale:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+                decoded = target
+
+            yield frame
+            k += 1
+    finally:
+        # Release the video object (also when the caller stops early)
+        video.release()
+
+def extract_frames(video_path, fps=30, width=None, height=None, grayscale=False):
+    """ Every frame of a video in one (n, h, w, 3) array. Only for short clips: for anything long, use `iter_frames`. """
+
+    frames = iter_frames(video_path, fps, width, height, grayscale)
+    first = next(frames, None)
+    if first is None:
+        return np.zeros((0, 0, 0, 3), dtype=np.uint8)
+
+    # written straight into one preallocated array (instead of a list + np.array, which holds two copies).
+    # the frame count is only an estimate, so grow it if needed
+    frames_array = np.empty((max(count_frames(video_path, fps), 1),) + first.shape, dtype=first.dtype)
+    frames_array[0] = first
+    n = 1
+    for frame in frames:
+        if n == len(frames_array):
+            frames_array = np.concatenate((frames_array, np.empty_like(frames_array)))
+        frames_array[n] = frame
+        n += 1
+
+    return frames_array[:n]
+
+def frame_reader(frames: Iterator[np.ndarray]) -> Callable[[int], np.ndarray | None]:
+    """ Turns a frame stream into `read(i)` -> frame i, for callers that skip frames (like a `FrameScheduler`).
+    `i` can only go forward. Skipped frames still get pulled from the stream, just not returned. None past the end. """
+    position = 0 # index of the next frame the stream yields
+    def read(i: int) -> np.ndarray | None:
+        nonlocal position
+        frame = None
+        while position <= i:
+            frame = next(frames, None)
+            position += 1
+        return frame
+    return read
+
+def get_bad_apple(width=None, height=None) -> np.ndarray:
 
     # Example usage:
-    video_path = './badapple72p.mp4'
-    frames = extract_frames(video_path, fps=30)
+    frames = extract_frames(BAD_APPLE_PATH, fps=30, width=width, height=height, grayscale=True)
     return frames
+
+def stream_bad_apple(width=None, height=None) -> Iterator[np.ndarray]:
+    """ Same frames as `get_bad_apple`, one at a time as they get decoded. """
+    return iter_frames(BAD_APPLE_PATH, fps=30, width=width, height=height, grayscale=True)
@@ -0,0 +1,214 @@
+"""
+Headless terminal emulator for the subset of escapes the renderers use, to check that what they print really
+reproduces the frame, and to count what a real terminal would have to parse.
+
+Understands:
+- cursor moves: CUP (`\\033[y;xH`, what `term.move_xy` gives), CUF (`\\033[nC`), CR and LF
+- SGR: truecolor (`38;2;r;g;b` / `48;2;r;g;b`), 256 colors (`38;5;n` / `48;5;n`), the 16 basic colors (30-37, 90-97,
+40-47, 100-107), default fg/bg (39/49) and reset (0). Anything else in an SGR (bold, etc.) is ignored.
+- REP (`\\033[nb`): repeats the last printed character
+- any other text, with `▀`, `▄`, `█` and space turned back into pixels by `pixels()`
+
+Other escapes (e.g. hiding the cursor) get counted and otherwise ignored.
+
+```python
+vt = VirtualTerminal(term_width, term_height)
+stuff.term_state.writer = vt # frames go to the emulator instead of the terminal
+presenter.present()
+assert (vt.pixels()[:frame.height, :frame.width] == frame.pixels).all()
+print(vt.report())
+```
+"""
+
+import codecs
+import re
+from time import perf_counter
+from typing import Dict, List, Tuple
+import numpy as np
+from output_buffer import OutputBuffer
+from palette import PALETTES
+
+_TOKEN = re.compile(r'\x1b\[([?0-9;]*)([@-~])|\r|\n|[^\x1b\r\n]+')
+_PARTIAL_ESCAPE = re.compile(r'\x1b(\[[?0-9;]*)?\Z')
+_PALETTE = PALETTES["256"].astype(np.int16)
+
+_ESCAPE_KINDS = {'H': "cup", 'C': "cuf", 'm': "sgr", 'b': "rep"}
+
+class VirtualTerminal:
+    """
+    Grid of `width` x `height` cells, each with a character, a fg and a bg color (-1 = terminal default).
+    Feed it output with `write` (str or bytes, escapes can be split between calls), or plug it in as
+    `TermState.writer`. For the renderers that go through print3 (sys.stdout), set `sys.stdout = vt` too.
+
+    Keeps per escape type counts, bytes and parse time in `stats`, as a rough measure of how much work the
+    output is for a terminal.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+
+        self.chars = np.full((height, width), ' ', dtype='<U1')
+        """ Character in every cell. """
+        self.fg = np.full((height, width, 3), -1, dtype=np.int16)
+        """ fg color of every cell, -1 for the terminal default. """
+        self.bg = np.full((height, width, 3), -1, dtype=np.int16)
+        """ bg color of every cell, -1 for the terminal default. """
+
+        self.x = 0
+        """ Cursor column. `width` means "pending wrap": the last column was just printed to. """
+        self.y = 0
+        self.cur_fg = np.full(3, -1, dtype=np.int16)
+        self.cur_bg = np.full(3, -1, dtype=np.int16)
+        self.last_char: str | None = None
+        """ Last printed character, what REP repeats. """
+
+        self.stats: Dict[str, List[float]] = {}
+        """ Per kind of token ("cup", "cuf", "sgr", "rep", "cr", "lf", "text", "other"): [count, bytes, seconds]. """
+        self.frames = 0
+        """ Number of `submit` calls, when used as a writer. """
+
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._pending = ''
+
+    # feeding output
+
+    def write(self, data: str | bytes) -> int:
+        """ Parses some output. Returns its length, like a file's write. """
+        text = self._decoder.decode(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        text = self._pending + text
+        # an escape cut off at the end gets finished by the next write
+        partial = _PARTIAL_ESCAPE.search(text)
+        if partial is not None:
+            text, self._pending = text[:partial.start()], text[partial.start():]
+        else:
+            self._pending = ''
+
+        for token in _TOKEN.finditer(text):
+            time_start = perf_counter()
+            kind = self._apply(token)
+            self._count(kind, len(token.group().encode()), perf_counter() - time_start)
+        return len(data)
+
+    def flush(self) -> None:
+        """ Nothing to flush, here so the emulator can stand in for sys.stdout. """
+
+    def submit(self, buffer: OutputBuffer) -> OutputBuffer:
+        """ `FrameWriter` interface: parses a frame's buffer right away and hands it back, emptied. """
+        self.write(buffer.getvalue())
+        buffer.clear()
+        self.frames += 1
+        return buffer
+
+    def drain(self) -> None:
+        """ `FrameWriter` interface. Everything submitted is already parsed. """
+
+    # parsing
+
+    def _count(self, kind: str, n_bytes: int, seconds: float) -> None:
+        entry = self.stats.setdefault(kind, [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += n_bytes
+        entry[2] += seconds
+
+    def _apply(self, token: re.Match) -> str:
+        """ Applies one token to the grid. Returns what kind of token it was. """
+        text = token.group()
+        if text == '\r':
+            self.x = 0
+            return "cr"
+        if text == '\n':
+            self.y = min(self.y+1, self.height-1)
+            self.x = min(self.x, self.width-1)
+            return "lf"
+        if text[0] != '\x1b':
+            self._print(text)
+            return "text"
+
+        params, command = token.group(1), token.group(2)
+        if params.startswith('?'):
+            return "other"
+        args = [int(p) if p else 0 for p in params.split(';')] if params else []
+
+        if command == 'H':
+            row = args[0] if len(args) > 0 and args[0] > 0 else 1
+            col = args[1] if len(args) > 1 and args[1] > 0 else 1
+            self.y = min(row, self.height) - 1
+            self.x = min(col, self.width) - 1
+        elif command == 'C':
+            n = args[0] if args and args[0] > 0 else 1
+            self.x = min(self.x+n, self.width-1)
+        elif command == 'm':
+            self._sgr(args or [0])
+        elif command == 'b':
+            n = args[0] if args and args[0] > 0 else 1
+            if self.last_char is not None:
+                self._print(self.last_char * n)
+        return _ESCAPE_KINDS.get(command, "other")
+
+    def _sgr(self, args: List[int]) -> None:
+        i = 0
+        while i < len(args):
+            code = args[i]
+            if code in (38, 48) and i+1 < len(args):
+                target = self.cur_fg if code == 38 else self.cur_bg
+                if args[i+1] == 2 and i+4 < len(args):
+                    target[:] = args[i+2:i+5]
+                    i += 5
+                    continue
+                if args[i+1] == 5 and i+2 < len(args):
+                    target[:] = _PALETTE[args[i+2]]
+                    i += 3
+                    continue
+            if code == 0:
+                self.cur_fg[:] = -1
+                self.cur_bg[:] = -1
+            elif code == 39:
+                self.cur_fg[:] = -1
+            elif code == 49:
+                self.cur_bg[:] = -1
+            elif 30 <= code <= 37 or 90 <= code <= 97:
+                self.cur_fg[:] = _PALETTE[code-30 if code < 90 else code-90+8]
+            elif 40 <= code <= 47 or 100 <= code <= 107:
+                self.cur_bg[:] = _PALETTE[code-40 if code < 100 else code-100+8]
+            i += 1
+
+    def _print(self, text: str) -> None:
+        """ Prints text at the cursor with the current colors, wrapping at the right edge (no scrolling:
+        past the bottom row, it keeps overwriting the bottom row). """
+        self.last_char = text[-1]
+        while text:
+            if self.x >= self.width: # pending wrap
+                self.x = 0
+                self.y = min(self.y+1, self.height-1)
+            n = min(len(text), self.width - self.x)
+            x, y = self.x, self.y
+            self.chars[y, x:x+n] = list(text[:n])
+            self.fg[y, x:x+n] = self.cur_fg
+            self.bg[y, x:x+n] = self.cur_bg
+            self.x += n
+            text = text[n:]
+
+    # results
+
+    def pixels(self, default_fg: Tuple[int, int, int] = (229, 229, 229), default_bg: Tuple[int, int, int] = (0, 0, 0)) -> np.ndarray:
+        """ (2*height, width, 3) uint8 image of the screen, 2 pixels per cell like a CameraFrame's pixels.
+        Characters other than the block glyphs show as their bg. Default colors are filled in with `default_fg`/`default_bg`. """
+        fg = np.where(self.fg < 0, np.array(default_fg, dtype=np.int16), self.fg)
+        bg = np.where(self.bg < 0, np.array(default_bg, dtype=np.int16), self.bg)
+
+        top_is_fg = ((self.chars == '▀') | (self.chars == '█'))[..., np.newaxis]
+        bottom_is_fg = ((self.chars == '▄') | (self.chars == '█'))[..., np.newaxis]
+
+        image = np.empty((self.height*2, self.width, 3), dtype=np.uint8)
+        image[0::2] = np.where(top_is_fg, fg, bg)
+        image[1::2] = np.where(bottom_is_fg, fg, bg)
+        return image
+
+    def report(self) -> str:
+        """ One line per kind of token: how many, how many bytes, how long parsing them took. """
+        total_bytes = sum(entry[1] for entry in self.stats.values())
+        lines = [f"[VirtualTerminal] {total_bytes} bytes parsed, {self.frames} frames"]
+        for kind, (count, n_bytes, seconds) in sorted(self.stats.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {kind:<6} {count:9d} x {n_bytes:10d} bytes {seconds*1000:9.2f}ms")
+        return "\n".join(lines)